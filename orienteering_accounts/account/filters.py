@@ -1,13 +1,9 @@
-from decimal import Decimal
-
 import django_filters
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, ButtonHolder, Submit, HTML
-from django.db.models import Sum, Q, F, Max
-from django.db.models.functions import Coalesce
 from django.urls import reverse
 
-from orienteering_accounts.account.models import Account, Transaction
+from orienteering_accounts.account.models import Account
 from django.utils.translation import ugettext_lazy as _
 
 
@@ -62,34 +58,25 @@ class AccountFilter(django_filters.FilterSet):
             ButtonHolder(
                 Submit('search', 'Hledat', css_class='btn btn-success'),
                 HTML(f'<a href="{reverse("accounts:export")}" class="btn btn-secondary">{_("Export")}</a>'),
+                HTML(f'<a href="{reverse("accounts:export")}?format=csv" class="btn btn-secondary">{_("Export CSV")}</a>'),
                 css_class="modal-footer"
             )
         )
 
     @property
     def qs(self):
-        queryset = super().qs.distinct()
+        queryset = super().qs
 
         if 'is_active' not in self.request.GET:
             queryset = queryset.filter(is_active=True)
 
-        queryset = queryset.annotate(
-            membership_paid_to=Max(
-                'transactions__period__date_to', filter=Q(
-                    transactions__purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP
-                )
-            )
-        )
+        queryset = queryset.annotate_balance().annotate_membership_paid_to()
+
         if 'o' in self.request.GET:
             ordering = self.request.GET['o']
 
             if 'balance' in ordering:
-                queryset = queryset.annotate(
-                    balance_=F('init_balance') + Coalesce(Sum(
-                        'transactions__amount',
-                        filter=~Q(transactions__purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP)
-                    ), Decimal(0))
-                ).order_by(f'{"-" if "-" in ordering else ""}balance_')
+                queryset = queryset.order_by(f'{"-" if "-" in ordering else ""}balance_')
             else:
                 queryset = queryset.order_by(ordering)
         else:
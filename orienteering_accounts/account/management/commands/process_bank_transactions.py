@@ -7,7 +7,8 @@ from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction
 
-from orienteering_accounts.account.models import Account, PaymentPeriod
+from orienteering_accounts.account.models import PaymentPeriod
+from orienteering_accounts.account.reconciliation import VariableSymbolIndex, process_bank_transactions
 from orienteering_accounts.rb.client import RBBankAPIClient
 
 logger = logging.getLogger(__name__)
@@ -25,13 +26,17 @@ class Command(BaseCommand):
         last_read_timestamp = cache.get(last_read_timestamp_cache_key) or timezone.now() - timedelta(hours=6)
         current_timestamp = timezone.now()
         payment_period = PaymentPeriod.get_last_period()
+        variable_symbol_index = VariableSymbolIndex.build()
 
+        # Statement lists newest transactions first, so it is processed only once it is downloaded whole,
+        # in reverse order across all pages. Downloads happen before the database transaction is opened.
         bank_transactions = RBBankAPIClient.get_transactions(from_date=last_read_timestamp, to_date=current_timestamp)
 
         with transaction.atomic():
-            for bank_transaction in reversed(bank_transactions):
-                logger.info(f'Processing bank transaction {bank_transaction.dict()}')
-                Account.process_bank_transaction(bank_transaction, payment_period)
+            created_bank_transactions = process_bank_transactions(reversed(bank_transactions), payment_period, variable_symbol_index)
+
+        charged_count = sum(bank_transaction.charged for bank_transaction in created_bank_transactions)
+        logger.info(f'Processed {len(bank_transactions)} bank transactions, {charged_count} charged')
 
         cache.set(last_read_timestamp_cache_key, current_timestamp)
 
@@ -0,0 +1,41 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.db.models import F, Q
+
+from orienteering_accounts.account.models import Account
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Verifies and rebuilds stored sums of transactions of accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', dest='check',
+                            help='Only logs accounts with wrong sums, nothing is changed')
+
+    def handle(self, **options):
+        logger.info(f'Verification of account balances started')
+
+        invalid_accounts = Account.all_objects.annotate(
+            expected_transactions_sum=Account.get_transactions_sum_expression(),
+            expected_transactions_sum_without_entries=Account.get_transactions_sum_expression(without_entries=True)
+        ).filter(
+            ~Q(transactions_sum=F('expected_transactions_sum')) |
+            ~Q(transactions_sum_without_entries=F('expected_transactions_sum_without_entries'))
+        )
+
+        invalid_account_ids = []
+        for account in invalid_accounts:
+            logger.warning(
+                f'Invalid balance of {account}: {account.transactions_sum} instead of {account.expected_transactions_sum}, '
+                f'{account.transactions_sum_without_entries} instead of {account.expected_transactions_sum_without_entries} without entries'
+            )
+            invalid_account_ids.append(account.pk)
+
+        if invalid_account_ids and not options.get('check', False):
+            Account.refresh_balances(invalid_account_ids)
+            logger.info(f'Rebuilt balances of {len(invalid_account_ids)} accounts')
+
+        logger.info(f'Verification of account balances finished')
@@ -0,0 +1,29 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from orienteering_accounts.account.models import Account
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Restores entry rights in ORIS to accounts with paid debts and membership, meant to be run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+                            help='Only logs changes, nothing is changed in ORIS')
+        parser.add_argument('--remove-rights', action='store_true', dest='remove_rights',
+                            help='Also removes entry rights of accounts with unpaid debts or membership, disabled by default')
+
+    def handle(self, **options):
+        dry_run = options.get('dry_run', False)
+        remove_rights = options.get('remove_rights', False)
+
+        logger.info(f'Entry rights synchronization started')
+
+        for change in Account.sync_entry_rights_in_oris(dry_run=dry_run, remove_rights=remove_rights):
+            action = 'Adding' if change.can_entry_self else 'Removing'
+            logger.info(f'{action} entry rights for {change.account}{" (dry run)" if dry_run else ""}')
+
+        logger.info(f'Entry rights synchronization finished')
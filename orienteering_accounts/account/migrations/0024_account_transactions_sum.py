@@ -0,0 +1,43 @@
+# Generated by Django 3.2.18 on 2026-10-18 09:36
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def compute_transactions_sums(apps, schema_editor):
+    Account = apps.get_model('account', 'Account')
+    Transaction = apps.get_model('account', 'Transaction')
+    output_field = models.DecimalField(decimal_places=2, max_digits=9)
+
+    def transactions_sum(transactions):
+        transactions = transactions.filter(account=OuterRef('pk')).exclude(purpose='CLUB_MEMBERSHIP')
+        transactions = transactions.values('account').annotate(transactions_sum=Sum('amount')).values('transactions_sum')
+        return Coalesce(Subquery(transactions, output_field=output_field), Value(Decimal(0)), output_field=output_field)
+
+    Account._base_manager.update(
+        transactions_sum=transactions_sum(Transaction.objects.all()),
+        transactions_sum_without_entries=transactions_sum(Transaction.objects.filter(origin_entry__isnull=True))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0023_banktransaction_purpose'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='transactions_sum',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=9),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='transactions_sum_without_entries',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=9),
+        ),
+        migrations.RunPython(compute_transactions_sums, migrations.RunPython.noop),
+    ]
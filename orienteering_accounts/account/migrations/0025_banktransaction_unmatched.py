@@ -0,0 +1,25 @@
+# Generated by Django 3.2.18 on 2026-10-18 09:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0024_account_transactions_sum'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='banktransaction',
+            name='account',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bank_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='banktransaction',
+            name='purpose',
+            field=models.CharField(choices=[('CLUB_MEMBERSHIP', 'Oddílový příspěvek'), ('DEBTS', 'Dluhy'), ('UNMATCHED', 'Nespárováno')], default='DEBTS', max_length=50, verbose_name='Účel transakce'),
+        ),
+    ]
@@ -2,6 +2,7 @@ import typing
 import uuid
 import logging
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
@@ -9,19 +10,25 @@ from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
 from django.db import models
-from django.db.models import Sum, QuerySet
+from django.db.models import Sum, QuerySet, OuterRef, Subquery, Value, F, Exists, ExpressionWrapper, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.db.models.functions import Coalesce
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
+from requests import RequestException
 
 from orienteering_accounts.core.models import BaseModel
+from orienteering_accounts.core.utils.db import bulk_upsert
+from orienteering_accounts.core.utils.iterators import batched, merge_concurrently
 from orienteering_accounts.core.templatetags.core import format_date
+from orienteering_accounts.oris import choices as oris_choices
 from orienteering_accounts.oris import models as oris_models
 from orienteering_accounts.oris.client import ORISClient
 from orienteering_accounts.core.utils import emails as email_utils
 from orienteering_accounts.google.client import client as google_client
-from orienteering_accounts.rb.models import Transaction as BankTransactionSchema
 
 
 logger = logging.getLogger(__name__)
@@ -89,8 +96,48 @@ class PaymentPeriod(BaseModel):
     def get_last_period(cls) -> 'PaymentPeriod':
         return cls.objects.order_by('-date_to').first()
 
+    @classmethod
+    def get_open_periods(cls) -> QuerySet['PaymentPeriod']:
+        return cls.objects.filter(date_to__gte=datetime.now().date()).order_by('date_to')
+
+    @property
+    def variable_symbol_prefix(self) -> str:
+        """ Club membership of the period is paid with variable symbol prefixed by year the period starts in """
+        return str(self.date_from.year)
+
+
+class AccountQuerySet(QuerySet):
+
+    def annotate_balance(self) -> 'AccountQuerySet':
+        return self.annotate(balance_=F('init_balance') + F('transactions_sum'))
+
+    def annotate_club_membership_paid(self) -> 'AccountQuerySet':
+        return self.annotate(club_membership_paid_=Exists(
+            Transaction.objects.filter(account=OuterRef('pk'), purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP)
+        ))
+
+    def annotate_can_entry_self(self) -> 'AccountQuerySet':
+        """ Accounts can entry themselves when their debts and club membership are paid """
+        return self.annotate_club_membership_paid().annotate(can_entry_self_=ExpressionWrapper(
+            # Balance is not negative
+            Q(transactions_sum__gte=-F('init_balance')) & Q(club_membership_paid_=True),
+            output_field=models.BooleanField()
+        ))
+
+    def without_entry_rights(self) -> 'AccountQuerySet':
+        return self.annotate_can_entry_self().filter(can_entry_self_=False)
 
-class AccountManager(BaseUserManager):
+    def annotate_membership_paid_to(self) -> 'AccountQuerySet':
+        return self.annotate(membership_paid_to=Subquery(
+            Transaction.objects.filter(
+                account=OuterRef('pk'), purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP
+            ).order_by(
+                F('period__date_to').desc(nulls_last=True)
+            ).values('period__date_to')[:1]
+        ))
+
+
+class AccountManager(BaseUserManager.from_queryset(AccountQuerySet)):
 
     def __init__(self, is_active=True, *args, **kwargs):
         self.is_active = is_active
@@ -103,6 +150,12 @@ class AccountManager(BaseUserManager):
         return qs
 
 
+class EntryRightsChange(typing.NamedTuple):
+    account: 'Account'
+    club_member_id: int
+    can_entry_self: bool
+
+
 class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
 
     USERNAME_FIELD = EMAIL_FIELD = 'registration_number'
@@ -120,6 +173,9 @@ class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
     born_year: int = models.PositiveIntegerField(verbose_name=_('Ročník'))
     is_late_with_club_membership_payment = models.BooleanField(default=False)
     init_balance = models.DecimalField(decimal_places=2, max_digits=9, default=Decimal(0))
+    # Sums of transactions maintained by Account.refresh_balances, see receivers at the end of the module and save()
+    transactions_sum = models.DecimalField(decimal_places=2, max_digits=9, default=Decimal(0), editable=False)
+    transactions_sum_without_entries = models.DecimalField(decimal_places=2, max_digits=9, default=Decimal(0), editable=False)
     leader_key = models.UUIDField(null=True)
     email = models.EmailField(null=True)
     email2 = models.EmailField(blank=True)
@@ -148,9 +204,21 @@ class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
     objects = AccountManager()
     all_objects = AccountManager(is_active=False)
 
+    BALANCE_FIELDS = ('transactions_sum', 'transactions_sum_without_entries')
+    DEBTS_VARIABLE_SYMBOL_PREFIXES = ('1000', '1001')
+
     def __str__(self):
         return self.full_name_inv
 
+    def save(self, *args, **kwargs):
+        # Sums of transactions loaded with the instance may be stale already, so they are written only when named
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.BALANCE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @classmethod
     def upsert_from_oris(cls, registered_user):
         account, created = cls.all_objects.update_or_create(
@@ -159,13 +227,77 @@ class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
         )
 
         if created:
-            club_member = ORISClient.get_club_member(account.oris_id)
-            account.email = club_member.email
-            account.role = Role.get_member_role()
-            account.save(update_fields=['email'])  # We update only email from ORIS club member at the moment
+            account.setup_created_from_oris()
+
+    def setup_created_from_oris(self):
+        club_member = ORISClient.get_club_member(self.oris_id)
+        self.email = club_member.email
+        self.role = Role.get_member_role()
+        self.save(update_fields=['email'])  # We update only email from ORIS club member at the moment
 
-            account.send_account_created_info_email()
-            account.add_to_google_workspace_group()
+        self.send_account_created_info_email()
+        self.add_to_google_workspace_group()
+
+    @classmethod
+    def import_from_oris(cls, sports: typing.Sequence[int] = (oris_choices.SPORT_OB, oris_choices.SPORT_MTBO),
+                         batch_size: int = settings.ORIS_IMPORT_BATCH_SIZE) -> typing.List['Account']:
+        """
+        Streams registered users of all sports concurrently and upserts them in batches.
+        Only created accounts are then set up from ORIS club member, failures are logged and don't stop the import.
+        Returns created accounts.
+        """
+        created_accounts = []
+
+        for registered_users in batched(cls.iter_unique_registered_users(sports), batch_size):
+            created_accounts += cls.bulk_upsert_from_oris(registered_users)
+
+        for account in created_accounts:
+            try:
+                account.setup_created_from_oris()
+            except Exception:
+                logger.exception(f'Setting up account {account.registration_number} created from ORIS failed')
+
+        return created_accounts
+
+    @classmethod
+    def iter_unique_registered_users(cls, sports: typing.Sequence[int]) -> typing.Iterator[oris_models.RegisteredUser]:
+        """
+        Users registered for more sports are yielded again only when they come from a later sport,
+        so the last sport wins regardless of the order in which the sports are downloaded.
+        """
+        def iter_sport(sport_index: int, sport: int):
+            for registered_user in ORISClient.iter_registered_users(sport=sport):
+                yield sport_index, registered_user
+
+        sport_indexes: typing.Dict[str, int] = {}
+
+        for sport_index, registered_user in merge_concurrently([iter_sport(*sport) for sport in enumerate(sports)]):
+            if sport_indexes.get(registered_user.registration_number, -1) < sport_index:
+                sport_indexes[registered_user.registration_number] = sport_index
+                yield registered_user
+
+    @classmethod
+    def bulk_upsert_from_oris(cls, registered_users: typing.List[oris_models.RegisteredUser]) -> typing.List['Account']:
+        """ Upserts batch of registered users by registration number, returns created accounts """
+        accounts = {
+            registered_user.registration_number: cls(**registered_user.dict())
+            for registered_user in registered_users
+        }
+        existing_registration_numbers = set(
+            cls.all_objects.filter(registration_number__in=accounts).values_list('registration_number', flat=True)
+        )
+
+        bulk_upsert(
+            cls,
+            list(accounts.values()),
+            unique_fields=['registration_number'],
+            update_fields=list(oris_models.RegisteredUser.__fields__)
+        )
+
+        return [
+            account for registration_number, account in accounts.items()
+            if registration_number not in existing_registration_numbers
+        ]
 
     @property
     def full_name(self):
@@ -177,20 +309,40 @@ class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
 
     @property
     def balance(self) -> Decimal:
-        return self.init_balance + Decimal(str(
-            self.transactions.exclude(
-                purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP
-            ).aggregate(balance=Coalesce(Sum('amount'), Decimal(0)))['balance'])
-        )
+        return self.init_balance + self.transactions_sum
 
     @property
     def balance_without_entries(self) -> Decimal:
-        return self.init_balance + Decimal(str(
-            self.transactions.exclude(
-                purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP
-            ).exclude(
-                origin_entry__isnull=False
-            ).aggregate(balance=Coalesce(Sum('amount'), Decimal(0)))['balance'])
+        return self.init_balance + self.transactions_sum_without_entries
+
+    @classmethod
+    def get_transactions_sum_expression(cls, without_entries: bool = False) -> Coalesce:
+        """ Sum of account's transactions, which count to the balance, as subquery """
+        transactions = Transaction.objects.filter(
+            account=OuterRef('pk')
+        ).exclude(
+            purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP
+        )
+
+        if without_entries:
+            transactions = transactions.exclude(origin_entry__isnull=False)
+
+        transactions_sum = transactions.values('account').annotate(transactions_sum=Sum('amount')).values('transactions_sum')
+        output_field = models.DecimalField(decimal_places=2, max_digits=9)
+
+        return Coalesce(Subquery(transactions_sum, output_field=output_field), Value(Decimal(0)), output_field=output_field)
+
+    @classmethod
+    def refresh_balances(cls, account_ids: typing.Iterable[int] = None) -> int:
+        """ Recomputes sums of transactions of given (or all) accounts in one UPDATE """
+        accounts = cls.all_objects.all()
+
+        if account_ids is not None:
+            accounts = accounts.filter(pk__in=set(account_ids))
+
+        return accounts.update(
+            transactions_sum=cls.get_transactions_sum_expression(),
+            transactions_sum_without_entries=cls.get_transactions_sum_expression(without_entries=True)
         )
 
     @property
@@ -207,11 +359,71 @@ class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
     def remove_entry_rights_in_oris(self):
         ORISClient.set_club_entry_rights(self.oris_club_member_id, can_entry_self=False)
 
+    @property
+    def can_entry_self(self) -> bool:
+        return self.debts_paid and self.club_membership_paid
+
+    @classmethod
+    def get_entry_rights_changes(cls, remove_rights: bool = False) -> typing.List['EntryRightsChange']:
+        """
+        Compares entry rights of all club members in ORIS (one getClubUserList call)
+        with rights accounts should have, and returns only those which differ.
+        Removals of rights are returned only with remove_rights, same as in remove_entry_rights_in_oris they are disabled.
+        """
+        club_roster = ORISClient.get_club_roster(max_age=0)
+        changes = []
+
+        for account in cls.objects.annotate_can_entry_self():
+            club_member = club_roster.get_member(account.oris_id)
+
+            if club_member is None:
+                continue
+
+            can_entry_self = account.can_entry_self_
+            if not can_entry_self and not remove_rights:
+                continue
+            if bool(club_member.allow_entry_self) != can_entry_self:
+                changes.append(EntryRightsChange(account, club_member.id, can_entry_self))
+
+        return changes
+
+    @classmethod
+    def sync_entry_rights_in_oris(cls, dry_run: bool = False, remove_rights: bool = False) -> typing.List['EntryRightsChange']:
+        """
+        Sets entry rights in ORIS only to accounts whose rights differ, requests are made concurrently.
+        Failed requests are logged and left for the next synchronization. Returns applied changes.
+        Rights of accounts which paid are restored only here, adding a payment does not wait for ORIS.
+        """
+        changes = cls.get_entry_rights_changes(remove_rights=remove_rights)
+
+        if dry_run:
+            return changes
+
+        def apply(change: EntryRightsChange) -> typing.Optional[EntryRightsChange]:
+            try:
+                ORISClient.set_club_entry_rights(change.club_member_id, can_entry_self=change.can_entry_self)
+            except RequestException:
+                logger.warning(f'Setting entry rights in ORIS failed for {change.account}', exc_info=True)
+                return None
+            return change
+
+        with ThreadPoolExecutor(max_workers=settings.ORIS_IMPORT_CONCURRENCY) as executor:
+            applied_changes = [change for change in executor.map(apply, changes) if change]
+
+        for change in applied_changes:
+            change.account.oris_club_member_id = change.club_member_id
+            change.account.is_late_with_club_membership_payment = not change.can_entry_self
+
+        cls.objects.bulk_update(
+            [change.account for change in applied_changes],
+            fields=['oris_club_member_id', 'is_late_with_club_membership_payment']
+        )
+
+        return applied_changes
+
     @classmethod
     def get_accounts_to_remove_entry_rights_in_oris(cls) -> QuerySet['Account']:
-        for account in cls.objects.all():
-            if not (account.debts_paid and account.club_membership_paid):
-                yield account
+        return cls.objects.without_entry_rights()
 
     def get_transactions_descendant(self):
         return self.transactions.order_by('-created')
@@ -227,12 +439,18 @@ class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
     @property
     def debts_variable_symbol(self):
         number = self.registration_number.replace('TZL', '')
-        return f'1000{number}'
+        return f'{self.DEBTS_VARIABLE_SYMBOL_PREFIXES[0]}{number}'
+
+    @cached_property
+    def club_membership_variable_symbol_prefix(self) -> str:
+        """ Prefix of the last payment period, which club membership is charged to """
+        payment_period = PaymentPeriod.get_last_period()
+        return payment_period.variable_symbol_prefix if payment_period else str(datetime.now().year)
 
     @property
     def club_membership_variable_symbol(self):
         number = self.registration_number.replace('TZL', '')
-        return f'2025{number}'
+        return f'{self.club_membership_variable_symbol_prefix}{number}'
 
     @property
     def club_membership_payment_message(self):
@@ -347,57 +565,6 @@ class Account(PermissionsMixin, AbstractBaseUser, BaseModel):
         if email2:
             google_client.delete_member(email2, group_email=group_email)
 
-    @classmethod
-    def process_bank_transaction(cls, bank_transaction: BankTransactionSchema, payment_period: PaymentPeriod):
-        variable_symbol = bank_transaction.variable_symbol
-        amount = bank_transaction.amount.value
-
-        if not variable_symbol or amount <= 0:
-            return
-
-        debts_variable_symbol_prefixes = ('1000', '1001')
-        club_membership_variable_symbol_prefix = str(datetime.now().year)
-
-        if variable_symbol.startswith(debts_variable_symbol_prefixes) or variable_symbol.startswith(club_membership_variable_symbol_prefix):
-
-            registration_number = variable_symbol[4:]
-
-            account = cls.objects.filter(registration_number=f'TZL{registration_number}').first()
-
-            transaction_kwargs = {
-                "amount": amount
-            }
-
-            if account:
-                if variable_symbol.startswith(club_membership_variable_symbol_prefix):
-                    # Membership payment
-                    transaction_kwargs.update(
-                        purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP,
-                        period=payment_period
-                    )
-                    purpose = BankTransaction.BankTransactionPurpose.CLUB_MEMBERSHIP
-                    logger.info('Processed and charged entry bank transactions', extra={'account': account, 'amount': amount})
-                else:
-                    transaction_kwargs.update(
-                        purpose=Transaction.TransactionPurpose.DEBTS
-                    )
-                    purpose = BankTransaction.BankTransactionPurpose.DEBTS
-                    logger.info('Processed and charged debts bank transactions', extra={'account': account, 'amount': amount})
-
-                bank_transaction, created = account.bank_transactions.get_or_create(
-                    remote_id=bank_transaction.entryReference,
-                    defaults=dict(
-                        date=bank_transaction.valueDate,
-                        amount=amount,
-                        charged=True,
-                        transaction_data=bank_transaction.dict(),
-                        purpose=purpose,
-                    )
-                )
-
-                if created:
-                    account.transactions.create(**transaction_kwargs)
-
 
 class Transaction(BaseModel):
 
@@ -435,11 +602,36 @@ class BankTransaction(BaseModel):
     class BankTransactionPurpose(models.TextChoices):
         CLUB_MEMBERSHIP = 'CLUB_MEMBERSHIP', _('Oddílový příspěvek')
         DEBTS = 'DEBTS', _('Dluhy')
+        UNMATCHED = 'UNMATCHED', _('Nespárováno')
 
     remote_id = models.CharField(max_length=255, verbose_name=_('ID transakce'), unique=True, db_index=True)
     date = models.DateTimeField(verbose_name=_('Datum'))
-    account = models.ForeignKey('account.Account', on_delete=models.CASCADE, related_name='bank_transactions')
+    # Incoming payments not matched to any account have no account and wait for review
+    account = models.ForeignKey('account.Account', null=True, on_delete=models.CASCADE, related_name='bank_transactions')
     amount = models.DecimalField(decimal_places=2, max_digits=9, verbose_name=_('Částka'))
     charged = models.BooleanField(default=False, verbose_name=_('Zúčtováno'))
     transaction_data = models.JSONField(verbose_name=_('Data transakce'))
     purpose = models.CharField(max_length=50, choices=BankTransactionPurpose.choices, default=BankTransactionPurpose.DEBTS, verbose_name=_('Účel transakce'))
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_transaction_account(sender, instance: Transaction, **kwargs):
+    instance._previous_account_id = None
+    if instance.pk:
+        instance._previous_account_id = Transaction.objects.filter(pk=instance.pk).values_list('account_id', flat=True).first()
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def refresh_transaction_account_balance(sender, instance: Transaction, **kwargs):
+    account_ids = {instance.account_id, getattr(instance, '_previous_account_id', None)} - {None}
+    Account.refresh_balances(account_ids)
+
+    if Transaction.account.is_cached(instance):
+        instance.account.refresh_from_db(fields=['transactions_sum', 'transactions_sum_without_entries'])
+
+
+@receiver(post_delete, sender='entry.Entry')
+def refresh_entry_account_balance(sender, instance, **kwargs):
+    # Transactions of deleted entry are no longer entry transactions (origin_entry is set to null)
+    Account.refresh_balances([instance.account_id])
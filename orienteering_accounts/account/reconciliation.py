@@ -0,0 +1,127 @@
+import logging
+import typing
+from datetime import datetime
+
+from orienteering_accounts.account.models import Account, BankTransaction, PaymentPeriod, Transaction
+from orienteering_accounts.rb.models import Transaction as BankTransactionSchema
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_PURPOSES = {
+    BankTransaction.BankTransactionPurpose.CLUB_MEMBERSHIP: Transaction.TransactionPurpose.CLUB_MEMBERSHIP,
+    BankTransaction.BankTransactionPurpose.DEBTS: Transaction.TransactionPurpose.DEBTS,
+}
+
+
+class VariableSymbolScheme(typing.NamedTuple):
+    """ Variable symbol is prefix followed by number of registration number """
+    prefix: str
+    purpose: BankTransaction.BankTransactionPurpose
+    period: typing.Optional[PaymentPeriod] = None
+
+
+def get_variable_symbol_schemes() -> typing.List[VariableSymbolScheme]:
+    """
+    Schemes use the same prefixes as variable symbols shown to members in payment instructions.
+    Club membership is accepted for all open payment periods and the last one, which the instructions are shown for.
+    """
+    periods = [*PaymentPeriod.get_open_periods(), PaymentPeriod.get_last_period()]
+    club_membership_prefixes = {period.variable_symbol_prefix: period for period in periods if period}
+    if not club_membership_prefixes:
+        club_membership_prefixes[str(datetime.now().year)] = None
+
+    return [
+        *(VariableSymbolScheme(prefix, BankTransaction.BankTransactionPurpose.DEBTS) for prefix in Account.DEBTS_VARIABLE_SYMBOL_PREFIXES),
+        *(
+            VariableSymbolScheme(prefix, BankTransaction.BankTransactionPurpose.CLUB_MEMBERSHIP, period)
+            for prefix, period in club_membership_prefixes.items()
+        ),
+    ]
+
+
+class VariableSymbolMatch(typing.NamedTuple):
+    account: Account
+    purpose: BankTransaction.BankTransactionPurpose
+    period: typing.Optional[PaymentPeriod] = None
+
+
+class VariableSymbolIndex:
+    """ Index of variable symbols of all active accounts for all schemes, built with one query """
+
+    def __init__(self, accounts: typing.Iterable[Account], schemes: typing.Sequence[VariableSymbolScheme]):
+        self.matches: typing.Dict[str, VariableSymbolMatch] = {}
+
+        for account in accounts:
+            number = account.registration_number.replace('TZL', '')
+            for scheme in schemes:
+                self.matches[f'{scheme.prefix}{number}'] = VariableSymbolMatch(account, scheme.purpose, scheme.period)
+
+    @classmethod
+    def build(cls) -> 'VariableSymbolIndex':
+        return cls(Account.objects.all(), get_variable_symbol_schemes())
+
+    def resolve(self, variable_symbol: typing.Optional[str]) -> typing.Optional[VariableSymbolMatch]:
+        if not variable_symbol:
+            return None
+        return self.matches.get(variable_symbol.strip())
+
+
+def process_bank_transactions(bank_transactions: typing.Iterable[BankTransactionSchema],
+                              payment_period: PaymentPeriod,
+                              index: VariableSymbolIndex = None) -> typing.List[BankTransaction]:
+    """
+    Charges incoming payments to accounts matched by variable symbol. Incoming payments without match
+    are stored without account as unmatched and left uncharged for review. Already processed bank transactions
+    are filtered out with one query, new bank transactions and transactions are bulk created.
+    Club membership is charged to payment period matched by variable symbol, payment_period is used otherwise.
+    Returns created bank transactions.
+    """
+    index = index or VariableSymbolIndex.build()
+
+    incoming_bank_transactions = {}
+    for bank_transaction in bank_transactions:
+        logger.info(f'Processing bank transaction {bank_transaction.dict()}')
+        if bank_transaction.amount.value > 0:
+            incoming_bank_transactions.setdefault(bank_transaction.entryReference, bank_transaction)
+
+    processed_remote_ids = set(
+        BankTransaction.objects.filter(remote_id__in=incoming_bank_transactions).values_list('remote_id', flat=True)
+    )
+
+    new_bank_transactions = []
+    new_transactions = []
+
+    for remote_id, bank_transaction in incoming_bank_transactions.items():
+        if remote_id in processed_remote_ids:
+            continue
+
+        amount = bank_transaction.amount.value
+        match = index.resolve(bank_transaction.variable_symbol)
+
+        if match:
+            new_transactions.append(Transaction(
+                account=match.account,
+                amount=amount,
+                purpose=TRANSACTION_PURPOSES[match.purpose],
+                period=(match.period or payment_period) if match.purpose == BankTransaction.BankTransactionPurpose.CLUB_MEMBERSHIP else None
+            ))
+            logger.info('Processed and charged bank transaction', extra={'account': match.account, 'amount': amount, 'purpose': match.purpose})
+        else:
+            logger.warning(f'Bank transaction {remote_id} with variable symbol {bank_transaction.variable_symbol} was not matched')
+
+        new_bank_transactions.append(BankTransaction(
+            remote_id=remote_id,
+            account=match.account if match else None,
+            date=bank_transaction.valueDate,
+            amount=amount,
+            charged=bool(match),
+            transaction_data=bank_transaction.dict(),
+            purpose=match.purpose if match else BankTransaction.BankTransactionPurpose.UNMATCHED,
+        ))
+
+    BankTransaction.objects.bulk_create(new_bank_transactions)
+    Transaction.objects.bulk_create(new_transactions)
+    # bulk_create doesn't send signals, which maintain balances
+    Account.refresh_balances({transaction.account_id for transaction in new_transactions})
+
+    return new_bank_transactions
@@ -5,6 +5,8 @@ from django.test import TestCase
 from django.core.management import call_command
 
 from orienteering_accounts.account.models import Account
+from orienteering_accounts.oris import choices as oris_choices
+from orienteering_accounts.oris.client import ORISClient
 
 
 ORIS_REGISTER_USERS_RESPONSE_DATA = {
@@ -39,9 +41,28 @@ ORIS_REGISTER_USERS_RESPONSE_DATA = {
 
 class ImportTestCase(TestCase):
 
-    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_get_request',
-                return_value=ORIS_REGISTER_USERS_RESPONSE_DATA)
-    def test_import_accounts_from_oris(self, mock_get_registered_users):
+    @mock.patch('orienteering_accounts.account.models.Account.setup_created_from_oris')
+    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_streamed_get_request',
+                side_effect=lambda endpoint, params: iter(ORIS_REGISTER_USERS_RESPONSE_DATA.items()))
+    def test_import_accounts_from_oris(self, mock_get_registered_users, mock_setup):
         call_command('import_accounts_from_oris')
         mock_get_registered_users.assert_called()
+        self.assertEqual(mock_setup.call_count, 2)
         self.assertEquals(Account.objects.count(), 2)
+
+    def test_import_accounts_from_oris_in_batches(self):
+        registered_users = [ORISClient.parse_registered_user(user_dict) for user_dict in ORIS_REGISTER_USERS_RESPONSE_DATA.values()]
+        mtbo_registered_user = registered_users[0].copy(update={'oris_fee': 100})
+
+        def iter_registered_users(sport):
+            return iter(registered_users if sport == oris_choices.SPORT_OB else [mtbo_registered_user])
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.iter_registered_users', side_effect=iter_registered_users), \
+                mock.patch('orienteering_accounts.account.models.Account.setup_created_from_oris') as mock_setup:
+            created_accounts = Account.import_from_oris(batch_size=1)
+            self.assertEqual(Account.import_from_oris(), [])
+
+        self.assertCountEqual([account.registration_number for account in created_accounts], ['TZL6666', 'TZL9999'])
+        self.assertEqual(mock_setup.call_count, 2)
+        self.assertEqual(Account.objects.count(), 2)
+        self.assertEqual(Account.objects.get(registration_number='TZL6666').oris_fee, 100)
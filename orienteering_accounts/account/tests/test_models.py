@@ -1,6 +1,9 @@
+from copy import deepcopy
 from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
 
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 from model_bakery import baker
@@ -9,6 +12,8 @@ from freezegun import freeze_time
 
 
 from orienteering_accounts.account.models import Transaction, Account
+from orienteering_accounts.oris.client import ORISClient
+from orienteering_accounts.oris.tests.test_client import CLUB_USER_LIST_RESPONSE_DATA
 
 
 class AccountTestCase(TestCase):
@@ -29,3 +34,104 @@ class AccountTestCase(TestCase):
 
         self.assertEqual(accounts_without_paid_club_memberships.count(), 2)
         self.assertCountEqual([account2.pk, account3.pk], accounts_without_paid_club_memberships.values_list('pk', flat=True))
+
+    def test_sync_entry_rights_in_oris(self):
+        response_data = deepcopy(CLUB_USER_LIST_RESPONSE_DATA)
+        response_data['ClubMembers']['Member_3']['AllowEntrySelf'] = '0'
+        club_roster = ORISClient.parse_club_roster(response_data)
+
+        accounts = [baker.make('account.Account', oris_id=user_id) for user_id in range(1, 4)]
+        for account in [accounts[0], accounts[2]]:
+            baker.make('account.Transaction', account=account, purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP, amount=Decimal('1'))
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.get_club_roster', return_value=club_roster), \
+                mock.patch('orienteering_accounts.oris.client.ORISClient.set_club_entry_rights') as mock_set_rights:
+            self.assertEqual(len(Account.sync_entry_rights_in_oris(dry_run=True, remove_rights=True)), 2)
+            mock_set_rights.assert_not_called()
+
+            # Rights are only restored by default
+            changes = Account.sync_entry_rights_in_oris()
+            self.assertEqual(mock_set_rights.call_args_list, [mock.call(1003, can_entry_self=True)])
+            self.assertEqual([change.account.pk for change in changes], [accounts[2].pk])
+
+            mock_set_rights.reset_mock()
+            club_roster.get_member(3).allow_entry_self = 1
+            changes = Account.sync_entry_rights_in_oris(remove_rights=True)
+
+        self.assertEqual(mock_set_rights.call_args_list, [mock.call(1002, can_entry_self=False)])
+        self.assertEqual([change.account.pk for change in changes], [accounts[1].pk])
+        self.assertTrue(Account.objects.get(pk=accounts[1].pk).is_late_with_club_membership_payment)
+        self.assertEqual(Account.objects.get(pk=accounts[2].pk).oris_club_member_id, 1003)
+
+    def test_balance_is_maintained(self):
+        account = baker.make('account.Account', init_balance=Decimal('100'))
+        entry = baker.make('entry.Entry', account=account)
+
+        baker.make('account.Transaction', account=account, purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP, amount=Decimal('2000'))
+        baker.make('account.Transaction', account=account, purpose=Transaction.TransactionPurpose.DEBTS, amount=Decimal('50'))
+        entry_transaction = account.transactions.create(purpose=Transaction.TransactionPurpose.ENTRY, amount=Decimal('-80'), origin_entry=entry)
+
+        self.assertEqual(account.transactions_sum, Decimal('-30'))
+
+        account = Account.objects.get(pk=account.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(account.balance, Decimal('70'))
+            self.assertEqual(account.balance_without_entries, Decimal('150'))
+            self.assertFalse(account.debts_payment_amount > 0)
+
+        entry_transaction.amount = Decimal('-200')
+        entry_transaction.save()
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal('-50'))
+
+        entry.delete()
+        account.refresh_from_db()
+        self.assertEqual(account.balance_without_entries, Decimal('-50'))
+
+        Transaction.objects.filter(account=account).delete()
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal('100'))
+
+    def test_save_of_stale_account_keeps_balance(self):
+        account = baker.make('account.Account')
+        stale_account = Account.objects.get(pk=account.pk)
+        baker.make('account.Transaction', account=account, purpose=Transaction.TransactionPurpose.DEBTS, amount=Decimal('50'))
+
+        stale_account.first_name = 'Chuck'
+        stale_account.save()
+
+        account.refresh_from_db()
+        self.assertEqual(account.first_name, 'Chuck')
+        self.assertEqual(account.transactions_sum, Decimal('50'))
+
+    def test_rebuild_account_balances(self):
+        account = baker.make('account.Account')
+        baker.make('account.Transaction', account=account, purpose=Transaction.TransactionPurpose.DEBTS, amount=Decimal('50'))
+        Account.objects.update(transactions_sum=Decimal(0))
+
+        call_command('rebuild_account_balances', check=True)
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal(0))
+
+        call_command('rebuild_account_balances')
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal('50'))
+
+    def test_get_accounts_to_remove_entry_rights_in_oris(self):
+        paid_account = baker.make('account.Account')
+        indebted_account = baker.make('account.Account')
+        unpaid_account = baker.make('account.Account', init_balance=Decimal('100'))
+        baker.make('account.Account', is_active=False)
+
+        for account in [paid_account, indebted_account]:
+            baker.make('account.Transaction', account=account, purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP, amount=Decimal('2000'))
+        baker.make('account.Transaction', account=indebted_account, purpose=Transaction.TransactionPurpose.ENTRY, amount=Decimal('-1'))
+
+        with self.assertNumQueries(1):
+            accounts = list(Account.get_accounts_to_remove_entry_rights_in_oris())
+
+        self.assertCountEqual([account.pk for account in accounts], [indebted_account.pk, unpaid_account.pk])
+        self.assertEqual(
+            [account.can_entry_self_ for account in Account.objects.annotate_can_entry_self().order_by('pk')],
+            [account.can_entry_self for account in Account.objects.order_by('pk')]
+        )
@@ -0,0 +1,106 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from freezegun import freeze_time
+from model_bakery import baker
+
+from orienteering_accounts.account.models import Account, BankTransaction, Transaction
+from orienteering_accounts.account.reconciliation import VariableSymbolIndex, process_bank_transactions
+from orienteering_accounts.rb.client import RBBankAPIClient
+from orienteering_accounts.rb.models import Transaction as BankTransactionSchema
+
+
+def make_bank_transaction(entry_reference: str, variable_symbol: str, amount: float) -> BankTransactionSchema:
+    return BankTransactionSchema(
+        entryReference=entry_reference,
+        amount={'value': amount, 'currency': 'CZK'},
+        creditDebitIndication='CRDT',
+        bookingDate='2024-03-01T00:00:00.000+01:00',
+        valueDate='2024-03-01T00:00:00.000+01:00',
+        bankTransactionCode={'code': '10000405000'},
+        entryDetails={'transactionDetails': {
+            'references': {},
+            'relatedParties': {},
+            'remittanceInformation': {'creditorReferenceInformation': {'variable': variable_symbol}}
+        }}
+    )
+
+
+class ReconciliationTestCase(TestCase):
+
+    @freeze_time('2026-01-15')
+    def test_variable_symbol_index(self):
+        account = baker.make('account.Account', registration_number='TZL6666')
+        baker.make('account.Account', registration_number='TZL1111', is_active=False)
+        baker.make('account.PaymentPeriod', date_from=date(2024, 9, 1), date_to=date(2025, 8, 31))
+        open_period = baker.make('account.PaymentPeriod', date_from=date(2025, 9, 1), date_to=date(2026, 8, 31))
+        next_period = baker.make('account.PaymentPeriod', date_from=date(2026, 9, 1), date_to=date(2027, 8, 31))
+
+        with self.assertNumQueries(3):
+            index = VariableSymbolIndex.build()
+
+        debts = BankTransaction.BankTransactionPurpose.DEBTS
+        club_membership = BankTransaction.BankTransactionPurpose.CLUB_MEMBERSHIP
+        self.assertEqual(index.resolve('10006666'), (account, debts, None))
+        self.assertEqual(index.resolve('10016666'), (account, debts, None))
+        # Payment instructions are shown for the last period, payments of all open periods are accepted
+        self.assertEqual(account.club_membership_variable_symbol, '20266666')
+        self.assertEqual(index.resolve(account.club_membership_variable_symbol), (account, club_membership, next_period))
+        self.assertEqual(index.resolve('20256666'), (account, club_membership, open_period))
+        self.assertIsNone(index.resolve('20246666'))
+        self.assertIsNone(index.resolve('10001111'))
+        self.assertIsNone(index.resolve(None))
+
+    def test_process_bank_transactions(self):
+        account1 = baker.make('account.Account', registration_number='TZL6666')
+        account2 = baker.make('account.Account', registration_number='TZL9999')
+        payment_period = baker.make('account.PaymentPeriod')
+        baker.make('account.BankTransaction', account=account1, remote_id='1')
+
+        bank_transactions = [
+            make_bank_transaction('1', '10006666', 100),
+            make_bank_transaction('2', '10006666', 200),
+            make_bank_transaction('2', '10006666', 200),
+            make_bank_transaction('3', account2.club_membership_variable_symbol, 2000),
+            make_bank_transaction('4', '10001111', 300),
+            make_bank_transaction('5', '10009999', -50),
+            make_bank_transaction('6', '', 50),
+        ]
+        index = VariableSymbolIndex.build()
+
+        with self.assertNumQueries(4):
+            created_bank_transactions = process_bank_transactions(bank_transactions, payment_period, index)
+
+        self.assertEqual([bank_transaction.remote_id for bank_transaction in created_bank_transactions], ['2', '3', '4', '6'])
+        self.assertEqual(Account.objects.get(pk=account1.pk).balance, Decimal('200'))
+        self.assertTrue(Account.objects.get(pk=account2.pk).club_membership_paid)
+        self.assertEqual(Transaction.objects.get(account=account2).period, payment_period)
+
+        unmatched_bank_transactions = BankTransaction.objects.filter(account__isnull=True)
+        self.assertCountEqual(unmatched_bank_transactions.values_list('remote_id', flat=True), ['4', '6'])
+        self.assertFalse(unmatched_bank_transactions.filter(charged=True).exists())
+        self.assertFalse(unmatched_bank_transactions.exclude(purpose=BankTransaction.BankTransactionPurpose.UNMATCHED).exists())
+
+        self.assertEqual(process_bank_transactions(bank_transactions, payment_period, index), [])
+
+    def test_statement_is_processed_in_chronological_order(self):
+        baker.make('account.PaymentPeriod')
+        responses = {
+            1: {'transactions': [make_bank_transaction('3', '1', 100).dict(), make_bank_transaction('2', '1', 100).dict()], 'lastPage': False},
+            2: {'transactions': [make_bank_transaction('1', '1', 100).dict()], 'lastPage': True},
+        }
+        processed_references = []
+
+        def process(bank_transactions, *args):
+            processed_references.extend(bank_transaction.entryReference for bank_transaction in bank_transactions)
+            return []
+
+        with mock.patch.object(RBBankAPIClient, 'make_get_request', side_effect=lambda endpoint, params: responses[params['page']]), \
+                mock.patch('orienteering_accounts.account.management.commands.process_bank_transactions.process_bank_transactions',
+                           side_effect=process):
+            call_command('process_bank_transactions')
+
+        self.assertEqual(processed_references, ['1', '2', '3'])
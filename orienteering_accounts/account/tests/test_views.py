@@ -0,0 +1,134 @@
+import csv
+import io
+import zipfile
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+
+from orienteering_accounts.account.models import Transaction
+from orienteering_accounts.core.utils.exports import XLSX_CONTENT_TYPE
+
+
+class AccountListViewTestCase(TestCase):
+
+    def setUp(self):
+        self.client.force_login(baker.make('account.Account', is_superuser=True))
+
+    def make_accounts(self, count: int):
+        for account in baker.make('account.Account', _quantity=count):
+            baker.make('account.Transaction', account=account, amount=Decimal('-100'), purpose=Transaction.TransactionPurpose.ENTRY)
+            baker.make('account.Transaction', account=account, amount=Decimal('2000'), purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP,
+                       period=baker.make('account.PaymentPeriod'))
+
+    def get_list_queries_count(self, **params) -> int:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('accounts:list'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_list_queries_count_does_not_depend_on_accounts_count(self):
+        self.make_accounts(2)
+        queries_count = self.get_list_queries_count()
+        sorted_queries_count = self.get_list_queries_count(o='-balance')
+
+        self.make_accounts(10)
+        self.assertEqual(self.get_list_queries_count(), queries_count)
+        self.assertEqual(self.get_list_queries_count(o='-balance'), sorted_queries_count)
+
+    def test_list_balances(self):
+        self.make_accounts(1)
+        response = self.client.get(reverse('accounts:list'))
+        account = next(account for account in response.context['filter'].qs if account.transactions.exists())
+        self.assertEqual(account.balance_, account.balance)
+        self.assertEqual(account.balance_, Decimal('-100'))
+        self.assertIsNotNone(account.membership_paid_to)
+
+
+class AccountExportViewTestCase(TestCase):
+
+    def setUp(self):
+        self.client.force_login(baker.make('account.Account', is_superuser=True, last_name='Admin'))
+
+        paid_account = baker.make('account.Account', last_name='Balboa', registration_number='TZL9999')
+        baker.make('account.Transaction', account=paid_account, amount=Decimal('2000'), purpose=Transaction.TransactionPurpose.CLUB_MEMBERSHIP)
+        indebted_account = baker.make('account.Account', last_name='Norris', registration_number='TZL6666')
+        baker.make('account.Transaction', account=indebted_account, amount=Decimal('-100'), purpose=Transaction.TransactionPurpose.ENTRY)
+
+    def get_export(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('accounts:export'), params)
+            content = b''.join(response.streaming_content)
+        return response, content, len(context)
+
+    def assert_export_queries_count_does_not_depend_on_accounts_count(self, **params):
+        _, _, queries_count = self.get_export(**params)
+
+        for account in baker.make('account.Account', _quantity=10):
+            baker.make('account.Transaction', account=account, amount=Decimal('-100'), purpose=Transaction.TransactionPurpose.ENTRY)
+
+        _, _, more_accounts_queries_count = self.get_export(**params)
+        self.assertEqual(more_accounts_queries_count, queries_count)
+
+    def test_csv_export(self):
+        _, content, _ = self.get_export(format='csv')
+
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[0], ['Jméno a Příjmení', 'Registrační číslo', 'Příspěvky uhrazeny', 'Dluhy uhrazeny'])
+        self.assertEqual(rows[2][1:], ['TZL9999', 'ANO', 'ANO'])
+        self.assertEqual(rows[3][1:], ['TZL6666', 'NE', 'NE'])
+
+        self.assert_export_queries_count_does_not_depend_on_accounts_count(format='csv')
+
+    def test_xlsx_export(self):
+        response, content, _ = self.get_export()
+
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+        self.assertIn('accounts.xlsx', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+            self.assertIn(b'TZL6666', workbook.read('xl/worksheets/sheet1.xml'))
+
+        self.assert_export_queries_count_does_not_depend_on_accounts_count()
+
+
+class BankTransactionListViewTestCase(TestCase):
+
+    def test_unmatched_bank_transactions(self):
+        self.client.force_login(baker.make('account.Account', is_superuser=True))
+        baker.make('account.BankTransaction', remote_id='1', account=baker.make('account.Account'), transaction_data={})
+        baker.make('account.BankTransaction', remote_id='2', account=None, transaction_data={})
+
+        response = self.client.get(reverse('accounts:bank_transactions'))
+        self.assertEqual(len(response.context['object_list']), 2)
+
+        response = self.client.get(reverse('accounts:bank_transactions'), {'unmatched': 1})
+        self.assertEqual([bank_transaction.remote_id for bank_transaction in response.context['object_list']], ['2'])
+
+
+class TransactionCreateViewTestCase(TestCase):
+
+    def setUp(self):
+        self.client.force_login(baker.make('account.Account', is_superuser=True))
+        self.account = baker.make('account.Account', is_late_with_club_membership_payment=True)
+
+    def add_debts_payment(self):
+        return self.client.post(reverse('accounts:transaction_add', args=[self.account.pk]), {
+            'amount': '500',
+            'note': '',
+            'account': self.account.pk,
+            'purpose': Transaction.TransactionPurpose.DEBTS,
+            'transaction_type': 'INCOME',
+        })
+
+    def test_payment_clears_late_flag_without_oris(self):
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.make_get_request') as mock_get_request:
+            self.add_debts_payment()
+
+        mock_get_request.assert_not_called()
+        self.account.refresh_from_db()
+        self.assertFalse(self.account.is_late_with_club_membership_payment)
+        self.assertEqual(self.account.balance, self.account.init_balance + Decimal('500'))
@@ -1,25 +1,18 @@
-import io
-import xlsxwriter
 import jwt
 
 from django import forms
 from django.conf import settings
-from django.contrib import messages
 from django.contrib.auth.forms import PasswordChangeForm, SetPasswordForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.contenttypes.models import ContentType
-from django.core.files.base import ContentFile
 from django.db import transaction
 from django.http import HttpResponseRedirect, HttpResponse, Http404
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
-from django.views import View
 from django.views.generic import CreateView, DetailView, UpdateView, ListView, TemplateView
 from django.utils.translation import ugettext_lazy as _, gettext
 from django_filters.views import FilterView
 
-from requests import HTTPError
-
 from orienteering_accounts.account.filters import AccountFilter
 from orienteering_accounts.account.forms import TransactionAddForm, AccountEditForm, PaymentPeriodForm, \
     TransactionEditForm
@@ -34,6 +27,7 @@ from django.contrib.auth.views import LoginView, PasswordChangeView
 from orienteering_accounts.account.forms import LoginForm
 from orienteering_accounts.core.mixins import PermissionsRequiredMixin
 from orienteering_accounts.core.models import ChangeLog
+from orienteering_accounts.core.utils.exports import ExportView, ExportColumn
 
 
 class PaymentPeriodListView(LoginRequiredMixin, PermissionsRequiredMixin, ListView):
@@ -84,44 +78,20 @@ class AccountListView(LoginRequiredMixin, PermissionsRequiredMixin, FilterView):
         return context_data
 
 
-class AccountExportView(LoginRequiredMixin, PermissionsRequiredMixin, View):
+class AccountExportView(LoginRequiredMixin, PermissionsRequiredMixin, ExportView):
     permissions_required = perms.account_view_perms
+    filename = 'accounts'
 
-    def get(self, *args, **kwargs):
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet()
-
-        worksheet.set_column(0, 0, width=20)
-        worksheet.set_column(0, 1, width=20)
-        worksheet.set_column(0, 2, width=20)
-        worksheet.set_column(0, 3, width=20)
-
-        worksheet.write(0, 0, gettext('Jméno a Příjmení'))
-        worksheet.write(0, 1, gettext('Registrační číslo'))
-        worksheet.write(0, 2, gettext('Příspěvky uhrazeny'))
-        worksheet.write(0, 3, gettext('Dluhy uhrazeny'))
-
-        for i, account in enumerate(Account.objects.order_by('last_name')):
-
-            row = i+1
-
-            worksheet.write(row, 0, account.full_name_inv)
-            worksheet.write(row, 1, account.registration_number)
-            worksheet.write(row, 2, gettext('ANO') if account.club_membership_paid else gettext('NE'))
-            worksheet.write(row, 3, gettext('ANO') if account.debts_paid else gettext('NE'))
+    def get_columns(self):
+        return [
+            ExportColumn(gettext('Jméno a Příjmení'), lambda account: account.full_name_inv),
+            ExportColumn(gettext('Registrační číslo'), lambda account: account.registration_number),
+            ExportColumn(gettext('Příspěvky uhrazeny'), lambda account: gettext('ANO') if account.club_membership_paid_ else gettext('NE')),
+            ExportColumn(gettext('Dluhy uhrazeny'), lambda account: gettext('ANO') if account.balance_ >= 0 else gettext('NE')),
+        ]
 
-        worksheet.fit_to_pages(1, 0)
-        workbook.close()
-        output.seek(0)
-
-        response = HttpResponse(
-            ContentFile(output.read()),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename=accounts.xlsx'
-
-        return response
+    def get_queryset(self):
+        return Account.objects.annotate_club_membership_paid().annotate_balance().order_by('last_name')
 
 
 class AccountDetailView(LoginRequiredMixin, PermissionsRequiredMixin, DetailView):
@@ -204,29 +174,22 @@ class TransactionCreate(LoginRequiredMixin, PermissionsRequiredMixin, CreateView
         return context_data
 
     def form_valid(self, form):
-        try:
-            with transaction.atomic():
-                created_transaction = form.save()
-                ChangeLog.objects.create(
-                    owner_id=self.request.user.pk,
-                    instance_type=ContentType.objects.get_for_model(Transaction),
-                    instance_id=created_transaction.pk,
-                    change_type=ChangeLog.ChangeType.CREATE
-                )
-                account = created_transaction.account
-                if created_transaction.purpose in [
-                    Transaction.TransactionPurpose.CLUB_MEMBERSHIP,
-                    Transaction.TransactionPurpose.DEBTS
-                ] and account.is_late_with_club_membership_payment:
-                    account.add_entry_rights_in_oris()
-                    account.is_late_with_club_membership_payment = False
-                    account.save()
-        except HTTPError:
-            messages.add_message(
-                self.request,
-                messages.ERROR,
-                _('Transakci nelze přidat, chyba při komunikaci s ORIS.')
+        with transaction.atomic():
+            created_transaction = form.save()
+            ChangeLog.objects.create(
+                owner_id=self.request.user.pk,
+                instance_type=ContentType.objects.get_for_model(Transaction),
+                instance_id=created_transaction.pk,
+                change_type=ChangeLog.ChangeType.CREATE
             )
+            account = created_transaction.account
+            if created_transaction.purpose in [
+                Transaction.TransactionPurpose.CLUB_MEMBERSHIP,
+                Transaction.TransactionPurpose.DEBTS
+            ] and account.is_late_with_club_membership_payment:
+                # Entry rights are restored in ORIS by sync_entry_rights_in_oris, the request does not wait for ORIS
+                account.is_late_with_club_membership_payment = False
+                account.save(update_fields=['is_late_with_club_membership_payment'])
 
         return HttpResponseRedirect(self.get_success_url())
 
@@ -333,45 +296,29 @@ class ClubroomChipNumberView(LoginRequiredMixin, PermissionsRequiredMixin, ListV
         return qs.order_by(*ordering)
 
 
-class ClubroomChipNumberExportView(LoginRequiredMixin, PermissionsRequiredMixin, View):
+class ClubroomChipNumberExportView(LoginRequiredMixin, PermissionsRequiredMixin, ExportView):
     permissions_required = perms.account_view_perms
+    filename = 'accounts'
 
-    def get(self, *args, **kwargs):
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet()
+    def get_columns(self):
+        return [
+            ExportColumn(gettext('Jméno a Příjmení'), lambda account: account.full_name_inv),
+            ExportColumn(gettext('Registrační číslo'), lambda account: account.registration_number),
+            ExportColumn(gettext('Číslo čipu'), lambda account: account.clubroom_chip_number),
+        ]
 
-        worksheet.set_column(0, 0, width=20)
-        worksheet.set_column(0, 1, width=20)
-        worksheet.set_column(0, 2, width=20)
-
-        worksheet.write(0, 0, gettext('Jméno a Příjmení'))
-        worksheet.write(0, 1, gettext('Registrační číslo'))
-        worksheet.write(0, 2, gettext('Číslo čipu'))
-
-        for i, account in enumerate(Account.all_objects.exclude(clubroom_chip_number='').order_by('last_name')):
-
-            row = i+1
-
-            worksheet.write(row, 0, account.full_name_inv)
-            worksheet.write(row, 1, account.registration_number)
-            worksheet.write(row, 2, account.clubroom_chip_number)
-
-        worksheet.fit_to_pages(1, 0)
-        workbook.close()
-        output.seek(0)
-
-        response = HttpResponse(
-            ContentFile(output.read()),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename=accounts.xlsx'
-
-        return response
+    def get_queryset(self):
+        return Account.all_objects.exclude(clubroom_chip_number='').order_by('last_name')
 
 
 class BankTransactionListView(LoginRequiredMixin, PermissionsRequiredMixin, ListView):
     model = BankTransaction
     permissions_required = perms.bank_transaction_view_perms
     template_name = 'account/bank_transaction/list.html'
-    ordering = ['-date']
\ No newline at end of file
+    ordering = ['-date']
+
+    def get_queryset(self):
+        qs = super().get_queryset().select_related('account')
+        if self.request.GET.get('unmatched'):
+            qs = qs.filter(account__isnull=True)
+        return qs
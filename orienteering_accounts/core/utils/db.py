@@ -0,0 +1,59 @@
+import typing
+
+from django.db import connections, router, models
+
+
+def bulk_upsert(model: typing.Type[models.Model],
+                objs: typing.List[models.Model],
+                unique_fields: typing.List[str],
+                update_fields: typing.List[str],
+                batch_size: int = 500) -> typing.List[int]:
+    """
+    Inserts objs with INSERT ... ON CONFLICT (unique_fields) DO UPDATE SET update_fields.
+    Fields with auto_now are always updated. Primary keys of inserted or updated rows are set to objs and returned.
+    Signals are not sent and save() is not called, same as with bulk_create.
+    """
+    if not objs:
+        return []
+
+    opts = model._meta
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+
+    fields = [field for field in opts.concrete_fields if field != opts.pk]
+    unique_columns = [opts.get_field(field_name).column for field_name in unique_fields]
+    update_columns = [opts.get_field(field_name).column for field_name in update_fields]
+    update_columns += [
+        field.column for field in fields
+        if getattr(field, 'auto_now', False) and field.column not in update_columns
+    ]
+    # Updating conflicting row by itself makes RETURNING cover all rows, even when there is nothing to update
+    update_columns = update_columns or unique_columns[:1]
+
+    row_placeholder = f'({", ".join(["%s"] * len(fields))})'
+    sql_prefix = f'INSERT INTO {quote_name(opts.db_table)} ({", ".join(quote_name(field.column) for field in fields)}) VALUES '
+    sql_suffix = (
+        f' ON CONFLICT ({", ".join(quote_name(column) for column in unique_columns)})'
+        f' DO UPDATE SET {", ".join(f"{quote_name(column)} = EXCLUDED.{quote_name(column)}" for column in update_columns)}'
+        f' RETURNING {quote_name(opts.pk.column)}'
+    )
+
+    pks = []
+
+    with connection.cursor() as cursor:
+        for i in range(0, len(objs), batch_size):
+            batch = objs[i:i + batch_size]
+            params = []
+            for obj in batch:
+                for field in fields:
+                    params.append(field.get_db_prep_save(field.pre_save(obj, add=True), connection=connection))
+
+            cursor.execute(sql_prefix + ', '.join([row_placeholder] * len(batch)) + sql_suffix, params)
+
+            for obj, (pk,) in zip(batch, cursor.fetchall()):
+                obj.pk = pk
+                obj._state.adding = False
+                obj._state.db = connection.alias
+                pks.append(pk)
+
+    return pks
@@ -0,0 +1,89 @@
+import abc
+import csv
+import tempfile
+import typing
+from itertools import chain
+
+import xlsxwriter
+from django.http import FileResponse, StreamingHttpResponse
+from django.views import View
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_FORMAT_XLSX = 'xlsx'
+EXPORT_FORMAT_CSV = 'csv'
+
+
+class ExportColumn(typing.NamedTuple):
+    header: str
+    value: typing.Callable[[typing.Any], typing.Any]
+    width: int = 20
+
+
+def xlsx_response(filename: str, columns: typing.Sequence[ExportColumn], rows: typing.Iterable) -> FileResponse:
+    """
+    Writes rows row by row in constant memory mode to temporary file, which is then streamed in chunks.
+    """
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
+
+    for col, column in enumerate(columns):
+        worksheet.set_column(col, col, width=column.width)
+        worksheet.write(0, col, column.header)
+
+    for row, item in enumerate(rows, start=1):
+        for col, column in enumerate(columns):
+            worksheet.write(row, col, column.value(item))
+
+    worksheet.fit_to_pages(1, 0)
+    workbook.close()
+    output.seek(0)
+
+    return FileResponse(output, as_attachment=True, filename=f'{filename}.xlsx', content_type=XLSX_CONTENT_TYPE)
+
+
+class _Echo:
+    """ File-like object returning written value, so csv.writer rows can be streamed """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_response(filename: str, columns: typing.Sequence[ExportColumn], rows: typing.Iterable) -> StreamingHttpResponse:
+    """ Streams rows as CSV while they are read, BOM is included for Excel to detect UTF-8 """
+    writer = csv.writer(_Echo())
+
+    content = chain(
+        ['\ufeff', writer.writerow([column.header for column in columns])],
+        (writer.writerow([column.value(item) for column in columns]) for item in rows)
+    )
+
+    response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename={filename}.csv'
+
+    return response
+
+
+class ExportView(View, metaclass=abc.ABCMeta):
+    """
+    Exports rows of get_queryset() with columns of get_columns() as XLSX, or as CSV with ?format=csv.
+    Queryset should annotate everything the columns need, it is read with iterator().
+    """
+    filename = 'export'
+
+    @abc.abstractmethod
+    def get_columns(self) -> typing.Sequence[ExportColumn]:
+        pass
+
+    @abc.abstractmethod
+    def get_queryset(self):
+        pass
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', EXPORT_FORMAT_XLSX)
+        rows = self.get_queryset().iterator()
+
+        if export_format == EXPORT_FORMAT_CSV:
+            return csv_response(self.filename, self.get_columns(), rows)
+
+        return xlsx_response(self.filename, self.get_columns(), rows)
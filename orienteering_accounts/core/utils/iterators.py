@@ -0,0 +1,64 @@
+import queue
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+T = typing.TypeVar('T')
+
+_DONE = object()
+
+
+def batched(iterable: typing.Iterable[T], size: int) -> typing.Iterator[typing.List[T]]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def merge_concurrently(iterables: typing.Sequence[typing.Iterable[T]], maxsize: int = 1000) -> typing.Iterator[T]:
+    """
+    Yields items of all iterables as soon as they are produced, each iterable is consumed in its own thread.
+    Producers wait while maxsize items are buffered, so memory stays bounded. Errors of producers are re-raised.
+    """
+    items = queue.Queue(maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce(iterable):
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    return
+                put((item, None))
+        except BaseException as e:
+            put((None, e))
+        else:
+            put((_DONE, None))
+
+    with ThreadPoolExecutor(max_workers=len(iterables)) as executor:
+        for iterable in iterables:
+            executor.submit(produce, iterable)
+
+        try:
+            remaining = len(iterables)
+            while remaining:
+                item, error = items.get()
+                if error is not None:
+                    raise error
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            # Lets producers finish when consumer stops early or fails
+            stopped.set()
@@ -0,0 +1,70 @@
+import typing
+from decimal import Decimal
+
+if typing.TYPE_CHECKING:
+    from orienteering_accounts.entry.models import Entry
+    from orienteering_accounts.event.models import Event
+
+
+class EntryFee(typing.NamedTuple):
+    fee_after_club_discount: Decimal
+    debt_init: Decimal
+
+
+class EntryFeeCalculator:
+    """
+    Calculates fees of entries of one event.
+    Category fees are looked up once and event results are fetched from ORIS at most once, only when needed.
+    Entries should have the account selected, see get_entries().
+    """
+
+    def __init__(self, event: 'Event'):
+        self.event = event
+        self.category_fees = {
+            category_dict.get('Name'): Decimal(category_dict.get('Fee', 0))
+            for category_dict in event.categories_data.values()
+        }
+
+    def get_entries(self, entries_qs=None) -> typing.List['Entry']:
+        """ Returns entries of the event with the account selected and sharing the event instance """
+        if entries_qs is None:
+            entries_qs = self.event.entries.all()
+
+        entries = list(entries_qs.select_related('account'))
+        for entry in entries:
+            entry.event = self.event
+        return entries
+
+    def get_category_fee(self, category_name: str) -> Decimal:
+        return self.category_fees.get(category_name, Decimal(0))
+
+    def get_fee_after_club_discount(self, entry: 'Entry') -> Decimal:
+        category_entry_fee = self.get_category_fee(entry.category_name)
+
+        if self.event.is_relay:
+            return Decimal(0)
+
+        if self.event.is_stage or self.event.did_not_start(entry.account.registration_number):
+            # In case of stage event or runner
+            fee = category_entry_fee
+        elif entry.account.is_adult:
+            fee = category_entry_fee / Decimal(2)
+        else:
+            fee = Decimal(0)
+
+        late_entry_fee = entry.fee - category_entry_fee
+        return fee + late_entry_fee
+
+    def get_entry_fee(self, entry: 'Entry') -> EntryFee:
+        fee_after_club_discount = self.get_fee_after_club_discount(entry)
+
+        additional_services_cost_sum = Decimal(0)
+        for service in entry.additional_services or []:
+            additional_services_cost_sum += Decimal(service['TotalFee'])
+
+        # FIXME solve late entries properly
+
+        return EntryFee(
+            fee_after_club_discount=fee_after_club_discount,
+            debt_init=fee_after_club_discount + additional_services_cost_sum
+        )
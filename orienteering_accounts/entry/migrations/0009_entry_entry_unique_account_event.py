@@ -0,0 +1,41 @@
+# Generated by Django 3.2.18 on 2026-10-18 09:25
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_entries(apps, schema_editor):
+    """
+    Keeps one entry per account and event, preferably the last billed one. Transactions of removed entries
+    are moved to the kept one, so balances don't change.
+    """
+    Entry = apps.get_model('entry', 'Entry')
+    Transaction = apps.get_model('account', 'Transaction')
+
+    duplicates = Entry.objects.values('account_id', 'event_id').annotate(count=Count('id')).filter(count__gt=1)
+
+    for duplicate in duplicates:
+        entries = list(Entry.objects.filter(
+            account_id=duplicate['account_id'], event_id=duplicate['event_id']
+        ).order_by('-id'))
+        kept_entry = next((entry for entry in entries if entry.debt is not None), entries[0])
+        removed_entry_ids = [entry.pk for entry in entries if entry.pk != kept_entry.pk]
+
+        Transaction.objects.filter(origin_entry_id__in=removed_entry_ids).update(origin_entry_id=kept_entry.pk)
+        Entry.objects.filter(pk__in=removed_entry_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0011_auto_20210512_2247'),
+        ('entry', '0008_auto_20221019_0018'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_entries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='entry',
+            constraint=models.UniqueConstraint(fields=('account', 'event'), name='entry_unique_account_event'),
+        ),
+    ]
@@ -1,12 +1,16 @@
 import logging
 import typing
+from collections import defaultdict
 from datetime import datetime
 from decimal import Decimal
 
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
 
-from orienteering_accounts.account.models import Account
+from orienteering_accounts.account.models import Account, Transaction
+from orienteering_accounts.core.utils.db import bulk_upsert
 from orienteering_accounts.oris.models import BaseEntry
 
 logger = logging.getLogger(__name__)
@@ -28,62 +32,109 @@ class Entry(models.Model):
     debt_note = models.CharField(max_length=255, null=True, blank=True)
     oris_club_note = models.TextField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'event'], name='entry_unique_account_event')
+        ]
+
     def __str__(self):
         return f'{self.event} entry {self.account}'
 
     @classmethod
-    def upsert_from_oris(cls, entry: BaseEntry, event: 'Event', additional_services: dict = {}) -> typing.Optional['Entry']:
-        if not entry.is_valid:
-            return
-
-        try:
-            account = Account.objects.get(**entry.account_kwargs)
-        except Account.DoesNotExist:
-            logger.warning(f'Entry for event {event} not created, account ORIS ID {entry.account_kwargs} does not exists.')
-            return
-
-        instance, _ = cls.objects.update_or_create(
-            account_id=account.pk,
-            event_id=event.pk,
-            defaults={
-                'additional_services': additional_services,
+    def bulk_upsert_from_oris(cls, entries: typing.List[BaseEntry], event: 'Event', additional_services: typing.Dict[int, typing.List] = None) -> typing.List['Entry']:
+        """ Upserts all ORIS entries of the event, accounts are resolved with a single query """
+        additional_services = additional_services or {}
+        entries = [entry for entry in entries if entry.is_valid]
+
+        account_lookups = defaultdict(set)
+        for entry in entries:
+            for field_name, value in entry.account_kwargs.items():
+                account_lookups[field_name].add(value)
+
+        accounts_filter = Q()
+        for field_name, values in account_lookups.items():
+            accounts_filter |= Q(**{f'{field_name}__in': values})
+
+        accounts = {}
+        if account_lookups:
+            for account in Account.objects.filter(accounts_filter):
+                for field_name in account_lookups:
+                    accounts[(field_name, getattr(account, field_name))] = account
+
+        # Entries are grouped by written fields as LegEntry does not contain all the Entry fields
+        instances_by_fields = defaultdict(dict)
+
+        for entry in entries:
+            account = accounts.get(next(iter(entry.account_kwargs.items())))
+
+            if not account:
+                logger.warning(f'Entry for event {event} not created, account ORIS ID {entry.account_kwargs} does not exists.')
+                continue
+
+            entry_data = {
+                'additional_services': entry.get_additional_services(additional_services),
                 **entry.dict(exclude={'oris_user_id', 'registration_number'})
             }
-        )
-
-        return instance
+            instance = cls(account=account, event=event, **entry_data)
+            instances_by_fields[tuple(entry_data)][account.pk] = instance
 
-    @property
-    def fee_after_club_discount(self):
-        category_entry_fee = self.event.get_category_fee(self.category_name)
+        instances = []
 
-        if self.event.is_relay:
-            fee = Decimal(0)
-        elif self.event.is_stage or self.event.did_not_start(self.account.registration_number):
-            # In case of stage event or runner
-            fee = category_entry_fee
-        else:
-            if self.account.is_adult:
-                fee = category_entry_fee / Decimal(2)
-            else:
-                fee = Decimal(0)
+        for field_names, account_instances in instances_by_fields.items():
+            account_instances = list(account_instances.values())
+            bulk_upsert(cls, account_instances, unique_fields=['account', 'event'], update_fields=list(field_names))
+            instances += account_instances
 
-        if not self.event.is_relay:
-            late_entry_fee = self.fee - category_entry_fee
-            fee += late_entry_fee
+        return instances
 
-        return fee
-
-    @property
-    def debt_init(self):
-        additional_services_cost_sum = Decimal(0)
-
-        self.additional_services: list
+    @classmethod
+    def save_bills(cls, entries: typing.List['Entry']):
+        """
+        Saves debts of entries together with their ENTRY and ENTRY_OTHER transactions in bulk.
+        Transactions are diffed with the stored ones, so only changed rows are written.
+        Bulk writes send no signals, balances of accounts are refreshed at the end.
+        """
+        if not entries:
+            return
 
-        if self.additional_services:
-            for service in self.additional_services:
-                additional_services_cost_sum += Decimal(service['TotalFee'])
+        purposes = [Transaction.TransactionPurpose.ENTRY, Transaction.TransactionPurpose.ENTRY_OTHER]
+        stored_transactions = {
+            (transaction_.origin_entry_id, transaction_.account_id, transaction_.purpose): transaction_
+            for transaction_ in Transaction.objects.filter(origin_entry__in=entries, purpose__in=purposes)
+        }
 
-        # FIXME solve late entries properly
+        transactions_to_create = []
+        transactions_to_update = []
+        transaction_ids_to_delete = []
+        now = timezone.now()
 
-        return self.fee_after_club_discount + additional_services_cost_sum
+        for entry in entries:
+            transactions_values = {
+                Transaction.TransactionPurpose.ENTRY: dict(amount=-entry.debt)
+            }
+            if entry.other_debt and entry.other_debt > Decimal(0):
+                transactions_values[Transaction.TransactionPurpose.ENTRY_OTHER] = dict(amount=-entry.other_debt, note=entry.debt_note)
+
+            for purpose in purposes:
+                stored_transaction = stored_transactions.get((entry.pk, entry.account_id, purpose))
+                values = transactions_values.get(purpose)
+
+                if values is None:
+                    # Case when other debt is deleted
+                    if stored_transaction:
+                        transaction_ids_to_delete.append(stored_transaction.pk)
+                elif stored_transaction is None:
+                    transactions_to_create.append(Transaction(origin_entry=entry, account_id=entry.account_id, purpose=purpose, **values))
+                elif any(getattr(stored_transaction, field_name) != value for field_name, value in values.items()):
+                    for field_name, value in values.items():
+                        setattr(stored_transaction, field_name, value)
+                    stored_transaction.modified = now
+                    transactions_to_update.append(stored_transaction)
+
+        with transaction.atomic():
+            cls.objects.bulk_update(entries, ['debt', 'other_debt', 'debt_note'])
+            Transaction.objects.bulk_create(transactions_to_create)
+            Transaction.objects.bulk_update(transactions_to_update, ['amount', 'note', 'modified'])
+            if transaction_ids_to_delete:
+                Transaction.objects.filter(pk__in=transaction_ids_to_delete).delete()
+            Account.refresh_balances({entry.account_id for entry in entries})
@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from model_bakery import baker
+
+
+class MergeDuplicateEntriesMigrationTestCase(TransactionTestCase):
+    migrate_from = [('entry', '0008_auto_20221019_0018')]
+    migrate_to = [('entry', '0009_entry_entry_unique_account_event')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        # Models of other apps are in their current state, only entry migrations are rolled back
+        other_apps_targets = [node for node in executor.loader.graph.leaf_nodes() if node[0] != 'entry']
+        return executor.loader.project_state(other_apps_targets + targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicate_entries_are_merged(self):
+        apps = self.migrate(self.migrate_from)
+        Account = apps.get_model('account', 'Account')
+        Event = apps.get_model('event', 'Event')
+        Entry = apps.get_model('entry', 'Entry')
+        Transaction = apps.get_model('account', 'Transaction')
+
+        account = baker.make(Account)
+        event, other_event = baker.make(Event, _quantity=2)
+
+        billed_entry = baker.make(Entry, account=account, event=event, debt=Decimal('100'))
+        duplicate_entry = baker.make(Entry, account=account, event=event, debt=None)
+        other_entry = baker.make(Entry, account=account, event=other_event)
+        baker.make(Transaction, account=account, origin_entry=duplicate_entry)
+
+        apps = self.migrate(self.migrate_to)
+        Entry = apps.get_model('entry', 'Entry')
+        Transaction = apps.get_model('account', 'Transaction')
+
+        self.assertCountEqual(Entry.objects.values_list('pk', flat=True), [billed_entry.pk, other_entry.pk])
+        self.assertEqual(Transaction.objects.get().origin_entry_id, billed_entry.pk)
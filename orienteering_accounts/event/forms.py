@@ -6,9 +6,11 @@ from django import forms
 from datetime import date
 
 from django.core.exceptions import ValidationError
-from django.forms import modelformset_factory
+from django.forms import modelformset_factory, BaseModelFormSet
+from django.utils.functional import cached_property
 
-from orienteering_accounts.account.models import Account, Transaction
+from orienteering_accounts.account.models import Account
+from orienteering_accounts.entry.fees import EntryFeeCalculator, EntryFee
 from orienteering_accounts.entry.models import Entry
 from orienteering_accounts.event.models import Event
 
@@ -51,17 +53,23 @@ class EntryBillForm(forms.ModelForm):
         models = Entry
         fields = ('debt', 'other_debt', 'debt_note')
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, fee_calculator: EntryFeeCalculator = None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fee_calculator = fee_calculator
         if not self.is_bound:
             if self.instance.debt:
                 self.initial['debt'] = self.instance.debt
             else:
-                self.initial['debt'] = self.instance.debt_init
+                self.initial['debt'] = self.entry_fee.debt_init
 
             if not self.instance.other_debt:
                 self.initial['other_debt'] = Decimal(0)
 
+    @cached_property
+    def entry_fee(self) -> EntryFee:
+        fee_calculator = self.fee_calculator or EntryFeeCalculator(self.instance.event)
+        return fee_calculator.get_entry_fee(self.instance)
+
     def clean_debt_note(self):
         other_debt = self.cleaned_data['other_debt']
         debt_note = self.cleaned_data['debt_note']
@@ -70,32 +78,48 @@ class EntryBillForm(forms.ModelForm):
 
         return debt_note
 
-    def save(self, *args, **kwargs):
-        entry = super().save(*args, **kwargs)
-        entry.transactions.update_or_create(
-            purpose=Transaction.TransactionPurpose.ENTRY,
-            account=entry.account,
-            defaults=dict(
-                amount=-entry.debt
-            )
-        )
-        if entry.other_debt and entry.other_debt > Decimal(0):
-            entry.transactions.update_or_create(
-                purpose=Transaction.TransactionPurpose.ENTRY_OTHER,
-                account=entry.account,
-                defaults=dict(
-                    amount=-entry.other_debt,
-                    note=entry.debt_note
-                )
-            )
-        else:
-            # Case when other debt is deleted
-            entry.transactions.filter(
-                purpose=Transaction.TransactionPurpose.ENTRY_OTHER,
-                account=entry.account
-            ).delete()
-
+    def save(self, commit=True):
+        entry = super().save(commit=False)
+        if commit:
+            Entry.save_bills([entry])
         return entry
 
 
-EventEntryBillFormSet = modelformset_factory(Entry, fields=['debt', 'other_debt', 'debt_note'], form=EntryBillForm, extra=0)
+class BaseEventEntryBillFormSet(BaseModelFormSet):
+    """
+    Entries of one event with the account selected and sharing one event instance,
+    so their fees are calculated by one calculator without additional queries and ORIS requests.
+    """
+
+    def __init__(self, *args, event: Event, **kwargs):
+        self.fee_calculator = EntryFeeCalculator(event)
+        super().__init__(*args, **kwargs)
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            self._queryset = self.fee_calculator.get_entries(super().get_queryset())
+        return self._queryset
+
+    def save(self, commit=True):
+        """
+        Returns entries of all forms, not only of changed ones, as untouched forms hold pre-filled debts.
+        Entries and their transactions are saved in bulk.
+        """
+        entries = [form.save(commit=False) for form in self.initial_forms]
+        if commit:
+            Entry.save_bills(entries)
+        return entries
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['fee_calculator'] = self.fee_calculator
+        return kwargs
+
+
+EventEntryBillFormSet = modelformset_factory(
+    Entry,
+    fields=['debt', 'other_debt', 'debt_note'],
+    form=EntryBillForm,
+    formset=BaseEventEntryBillFormSet,
+    extra=0
+)
@@ -1,19 +1,24 @@
 import logging
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, call_command
 
 from orienteering_accounts.event.models import Event
+from orienteering_accounts.oris.client import ORISClient
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true', dest='incremental',
+                            help='Skips events with unchanged ORIS version and timestamps')
+
     def handle(self, **options):
 
         logger.info('Started importing events from ORIS')
 
-        Event.import_from_oris()
+        Event.import_from_oris(incremental=options.get('incremental', False))
 
         logger.info('Finished importing events from ORIS')
 
@@ -23,6 +28,8 @@ class Command(BaseCommand):
 
         logger.info('Finished refreshing events from ORIS')
 
+        call_command('update_event_results')
+
         logger.info('Started sending payment info emails')
 
         Event.send_payment_info_emails()
@@ -40,3 +47,5 @@ class Command(BaseCommand):
         Event.send_leader_debts_emails()
 
         logger.info('Finished sending debts leader info emails')
+
+        logger.info(f'ORIS throttling stats: {ORISClient.get_throttle_stats()}')
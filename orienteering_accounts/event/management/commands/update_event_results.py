@@ -0,0 +1,21 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from orienteering_accounts.event.models import Event
+from orienteering_accounts.oris.client import ORISClient
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Stores ORIS results of finished events, meant to be run periodically until the results are stable'
+
+    def handle(self, **options):
+        logger.info('Started updating results of finished events from ORIS')
+
+        changed_count = Event.refresh_results_from_oris()
+
+        logger.info(f'Finished updating results of finished events from ORIS, results of {changed_count} events changed')
+
+        logger.info(f'ORIS throttling stats: {ORISClient.get_throttle_stats()}')
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.18 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0012_event_handled_disabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='results_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='results_stable',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='results_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,11 +1,13 @@
 import typing, logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from decimal import Decimal
 from urllib.parse import urljoin
 
 from django.conf import settings
-from django.db import models
-from django.db.models import QuerySet
+from django.db import models, transaction
+from django.db.models import QuerySet, Q
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
@@ -16,12 +18,21 @@ from orienteering_accounts.account.models import Account
 from orienteering_accounts.entry.models import Entry
 from orienteering_accounts.oris.client import ORISClient
 from orienteering_accounts.core.utils import emails as email_utils
+from orienteering_accounts.core.utils.db import bulk_upsert
 from orienteering_accounts.oris import choices as oris_choices
-from orienteering_accounts.oris.models import Result
+from orienteering_accounts.oris.models import BaseEntry, Event as OrisEvent, Result as OrisResult
+from orienteering_accounts.result.models import Result
 
 logger = logging.getLogger(__name__)
 
 
+class EventEntriesData(typing.NamedTuple):
+    """ ORIS data needed to update entries of one event, fetched ahead of the database writes """
+    entries: typing.List[BaseEntry]
+    additional_services: typing.Dict[int, typing.List]
+    club_entry_exists: typing.Optional[bool] = None
+
+
 class Event(models.Model):
 
     class ProcessingType(models.TextChoices):
@@ -31,6 +42,8 @@ class Event(models.Model):
         BILLS_EMAIL_SENT = 'BILLS_EMAIL_SENT', _('Odeslány dluhy vedoucímu')
         BILLS_SOLVED = 'BILLS_SOLVED', _('Dluhy spočteny')
 
+    ORIS_VERSION_FIELDS = ('oris_version', 'oris_classes_last_modified_timestamp', 'oris_services_last_modified_timestamp')
+
     oris_id = models.PositiveIntegerField(unique=True)
     name = models.CharField(max_length=255, verbose_name=_('Název'))
     date = models.DateField()
@@ -66,6 +79,9 @@ class Event(models.Model):
     leader = models.ForeignKey(Account, on_delete=models.SET_NULL, blank=True, null=True)
     processing_state = models.CharField(max_length=50, choices=ProcessingType.choices, default=ProcessingType.UNPROCESSED)
     bills_solved_at = models.DateTimeField(null=True, blank=True)
+    results_updated_at = models.DateTimeField(null=True, blank=True)
+    results_changed_at = models.DateTimeField(null=True, blank=True)
+    results_stable = models.BooleanField(default=False)
 
     class Meta:
         ordering = ("date",)
@@ -85,26 +101,169 @@ class Event(models.Model):
         return str
 
     @classmethod
-    def import_from_oris(cls):
-        for sport in [oris_choices.SPORT_OB, oris_choices.SPORT_MTBO, oris_choices.SPORT_LOB]:
-            for event in ORISClient.get_events(sport=sport, include_unofficial_events=1):
+    def import_from_oris(cls, incremental: bool = False):
+        """
+        Imports events of all sports from ORIS and updates entries of upcoming events.
+        In incremental mode events with unchanged ORIS version and timestamps are skipped entirely
+        and entries are refetched only when classes or services timestamp moved.
+        """
+        sports = [oris_choices.SPORT_OB, oris_choices.SPORT_MTBO, oris_choices.SPORT_LOB]
+
+        with ThreadPoolExecutor(max_workers=settings.ORIS_IMPORT_CONCURRENCY) as executor:
+            sports_events = executor.map(lambda sport: ORISClient.get_events(sport=sport, include_unofficial_events=1), sports)
+
+        events = [event for events in sports_events for event in events]
+
+        stored_versions = {}
+        if incremental:
+            stored_versions = {
+                oris_id: versions
+                for oris_id, *versions in cls.objects.filter(
+                    oris_id__in=[event.oris_id for event in events]
+                ).values_list('oris_id', *cls.ORIS_VERSION_FIELDS)
+            }
+
+        events_to_upsert = {}
+        entries_changed_oris_ids = set()
+
+        for event in events:
+            stored_version = stored_versions.get(event.oris_id)
+            entries_changed = True
+
+            if stored_version is not None:
+                event_version = [getattr(event, field_name) for field_name in cls.ORIS_VERSION_FIELDS]
+                if event_version == stored_version:
+                    continue
+                # Entries and services change together with classes and services timestamps
+                entries_changed = event_version[1:] != stored_version[1:]
+
+            events_to_upsert[event.oris_id] = event
+            if entries_changed:
+                entries_changed_oris_ids.add(event.oris_id)
+
+        upcoming_instances = [
+            instance for instance in cls.bulk_upsert_from_oris(list(events_to_upsert.values()))
+            if instance.oris_id in entries_changed_oris_ids and instance.date and instance.date >= timezone.now().date()
+        ]
+
+        logger.info(f'{len(upcoming_instances)} upcoming events to update entries from ORIS.')
+
+        updated_pks = set()
+
+        for instance, entries_data in cls.fetch_entries_from_oris(upcoming_instances):
+            instance.update_entries(entries_data.entries, entries_data.additional_services)
+            if instance.should_be_handled(club_entry_exists=entries_data.club_entry_exists):
+                instance.handled = True
+                instance.save(update_fields=['handled'])
+            updated_pks.add(instance.pk)
+
+        # Versions of events which entries were not fetched are forgotten, so the next incremental import fetches them
+        cls.objects.filter(
+            pk__in=[instance.pk for instance in upcoming_instances if instance.pk not in updated_pks]
+        ).update(**{field_name: None for field_name in cls.ORIS_VERSION_FIELDS})
+
+    @classmethod
+    def fetch_entries_from_oris(cls, events: typing.List['Event']) -> typing.Iterator[typing.Tuple['Event', EventEntriesData]]:
+        """
+        Fetches ORIS entries data of events in a bounded thread pool. Results are yielded in order of events
+        as they arrive, so the caller remains the only one writing to the database.
+        Events which data could not be fetched are logged and skipped.
+        """
+        with ThreadPoolExecutor(max_workers=settings.ORIS_IMPORT_CONCURRENCY) as executor:
+            futures = [executor.submit(event.fetch_entries_data) for event in events]
+            for event, future in zip(events, futures):
                 try:
-                    instance = cls.objects.get(oris_id=event.oris_id)
-                    cls.objects.filter(oris_id=event.oris_id).update(**event.dict(exclude_unset=True))
-                    instance.refresh_from_db()
-                except cls.DoesNotExist:
-                    instance = cls.upsert_from_oris(event)
-                if instance.date and instance.date >= timezone.now().date():
-                    instance.update_entries()
-                    if instance.should_be_handled():
-                        instance.handled = True
-                        instance.save(update_fields=['handled'])
+                    entries_data = future.result()
+                except Exception:
+                    logger.exception(f'Fetching entries of event {event} from ORIS failed')
+                    continue
+                yield event, entries_data
+
+    def fetch_entries_data(self) -> EventEntriesData:
+        """ Network only, must not touch the database as it runs in worker threads """
+        club_entry_exists = None
+
+        if not (self.handled or self.handled_disabled) and self.is_relay:
+            club_entry_exists = ORISClient.club_entry_exists(self.oris_id)
+
+        return EventEntriesData(
+            entries=ORISClient.get_event_entries(self.oris_id),
+            additional_services=ORISClient.get_event_additional_services(self.oris_id),
+            club_entry_exists=club_entry_exists
+        )
 
     @classmethod
     def refresh_from_oris(cls):
         for event in cls.objects.filter(handled=True, processing_state=cls.ProcessingType.UNPROCESSED):
             event._refresh_from_oris()
 
+    @classmethod
+    def results_to_refresh(cls):
+        """
+        Handled events finished in last REFRESH_EVENTS_BEFORE_DAYS days with bills not solved yet,
+        which results are not stable and were not polled in last ORIS_RESULTS_REFRESH_INTERVAL_MINUTES.
+        """
+        now = timezone.now()
+        return cls.objects.filter(
+            Q(results_updated_at__isnull=True) |
+            Q(results_updated_at__lte=now - timedelta(minutes=settings.ORIS_RESULTS_REFRESH_INTERVAL_MINUTES)),
+            handled=True,
+            results_stable=False,
+            date__lt=now.date(),
+            date__gte=now.date() - timedelta(days=settings.REFRESH_EVENTS_BEFORE_DAYS)
+        ).exclude(processing_state=cls.ProcessingType.BILLS_SOLVED)
+
+    @classmethod
+    def refresh_results_from_oris(cls) -> int:
+        """
+        Stores results of events to refresh and returns count of events with changed results.
+        Results are fetched in a bounded thread pool and written by the calling thread.
+        """
+        events = list(cls.results_to_refresh())
+
+        logger.info(f'{len(events)} past events to refresh results from ORIS.')
+
+        changed_count = 0
+
+        with ThreadPoolExecutor(max_workers=settings.ORIS_IMPORT_CONCURRENCY) as executor:
+            futures = [executor.submit(ORISClient.get_event_results, event.oris_id) for event in events]
+            for event, future in zip(events, futures):
+                try:
+                    changed_count += event.update_results(future.result())
+                except Exception:
+                    logger.exception(f'Refreshing results of event {event} from ORIS failed')
+
+        return changed_count
+
+    def update_results(self, results: typing.Dict[str, OrisResult] = None) -> bool:
+        """
+        Stores results and returns whether they changed since last poll.
+        Results are stable, once they are not empty and did not change for ORIS_RESULTS_STABLE_AFTER_HOURS,
+        stable results are not polled anymore.
+        """
+        if results is None:
+            results = ORISClient.get_event_results(self.oris_id)
+
+        stored_results = set(self.event_results.values_list('registration_number', 'class_name', 'time'))
+        changed = stored_results != {(result.registration_number, result.class_name, result.time) for result in results.values()}
+
+        now = timezone.now()
+
+        with transaction.atomic():
+            if changed:
+                Result.bulk_upsert_from_oris(results.values(), self)
+                self.event_results.exclude(registration_number__in=list(results)).delete()
+                self.__dict__.pop('results', None)
+                self.results_changed_at = now
+
+            self.results_updated_at = now
+            self.results_stable = bool(results) and not changed and self.results_changed_at is not None and (
+                now - self.results_changed_at >= timedelta(hours=settings.ORIS_RESULTS_STABLE_AFTER_HOURS)
+            )
+            self.save(update_fields=['results_updated_at', 'results_changed_at', 'results_stable'])
+
+        return changed
+
     @classmethod
     def upsert_from_oris(cls, event):
         instance, _ = cls.objects.update_or_create(
@@ -114,6 +273,25 @@ class Event(models.Model):
         instance.refresh_from_db()
         return instance
 
+    @classmethod
+    def bulk_upsert_from_oris(cls, events: typing.List[OrisEvent]) -> typing.List['Event']:
+        """
+        Upserts ORIS events with batched INSERT ... ON CONFLICT (oris_id) and returns their current instances.
+        Only fields present in ORIS response are updated, same as in single event update.
+        """
+        instances_by_fields = defaultdict(list)
+
+        for event in events:
+            event_data = event.dict(exclude_unset=True)
+            instances_by_fields[tuple(event_data)].append(cls(**event_data))
+
+        pks = []
+        for field_names, instances in instances_by_fields.items():
+            pks += bulk_upsert(cls, instances, unique_fields=['oris_id'], update_fields=list(field_names))
+
+        instances = cls.objects.in_bulk(pks)
+        return [instances[pk] for pk in pks]
+
     @classmethod
     def to_refresh(cls):
         return cls.objects.filter(
@@ -135,18 +313,14 @@ class Event(models.Model):
             logger.info(f'Sending payment email for event {event}.')
             event.send_payment_info_email()
 
-    def update_entries(self):
-        additional_services = ORISClient.get_event_additional_services(self.oris_id)
-
-        account_ids = set()
-
-        for entry in ORISClient.get_event_entries(self.oris_id):
+    def update_entries(self, entries: typing.List[BaseEntry] = None, additional_services: typing.Dict[int, typing.List] = None):
+        if additional_services is None:
+            additional_services = ORISClient.get_event_additional_services(self.oris_id)
 
-            entry_additional_services = entry.get_additional_services(additional_services)
+        if entries is None:
+            entries = ORISClient.get_event_entries(self.oris_id)
 
-            entry = Entry.upsert_from_oris(entry, self, entry_additional_services)
-            if entry:
-                account_ids.add(entry.account_id)
+        account_ids = [entry.account_id for entry in Entry.bulk_upsert_from_oris(entries, self, additional_services)]
 
         self.entries.exclude(account_id__in=account_ids).delete()
 
@@ -237,6 +411,15 @@ class Event(models.Model):
         self.processing_state = Event.ProcessingType.LEADER_EMAIL_SENT
         self.save(update_fields=['processing_state'])
 
+    def solve_bills(self, entries: typing.List[Entry]):
+        """ Saves bills of entries and marks them solved in one transaction """
+        with transaction.atomic():
+            Entry.save_bills(entries)
+            self.bills_solved = True
+            self.processing_state = Event.ProcessingType.BILLS_SOLVED
+            self.bills_solved_at = timezone.now()
+            self.save(update_fields=['processing_state', 'bills_solved', 'bills_solved_at'])
+
     def get_category_fee(self, category_name: str) -> Decimal:
         for _, category_dict in self.categories_data.items():
             if category_dict.get('Name') == category_name:
@@ -253,24 +436,20 @@ class Event(models.Model):
 
     @cached_property
     def results(self) -> typing.Dict[str, Result]:
-        return ORISClient.get_event_results(self.oris_id)
+        """ Results stored by refresh_results_from_oris(), by registration number """
+        return {result.registration_number: result for result in self.event_results.all()}
 
     def did_not_start(self, registration_number: str) -> bool:
         result = self.results.get(registration_number)
+        return result is None or result.did_not_start
 
-        if not result:
-            return True
-
-        if result.time == 'DNS':
-            return True
-
-        return False
-
-    def should_be_handled(self) -> bool:
+    def should_be_handled(self, club_entry_exists: bool = None) -> bool:
         if self.handled or self.handled_disabled:
             return False
 
         if self.is_relay:
-            return ORISClient.club_entry_exists(self.oris_id)
+            if club_entry_exists is None:
+                club_entry_exists = ORISClient.club_entry_exists(self.oris_id)
+            return club_entry_exists
 
         return self.entries.exists()
@@ -1113,4 +1113,48 @@ ORIS_EVENT_RESPONSE_DATA = {
     "CurrentEntriesCount": "197",
     "CurrentStartsCount": "0",
     "CurrentResultsCount": "0"
-}
\ No newline at end of file
+}
+ORIS_EVENT_ENTRIES_RESPONSE_DATA = {
+    "Entry_1830201": {
+        "ID": "1830201",
+        "ClassID": "125509",
+        "ClassDesc": "D10",
+        "RegNo": "TZL6666",
+        "UserID": "390",
+        "ClubUserID": "5551",
+        "Name": "Norris Chuck",
+        "SI": "7207026",
+        "Licence": "C",
+        "RequestedStart": "",
+        "RentSI": "0",
+        "Note": "",
+        "ClubNote": "",
+        "Fee": "80",
+        "EntryStop": "0",
+        "CreatedDateTime": "2020-10-01 10:12:53",
+        "CreatedByUserID": "390",
+        "UpdatedDateTime": "",
+        "UpdatedByUserID": ""
+    },
+    "Entry_1830202": {
+        "ID": "1830202",
+        "ClassID": "127758",
+        "ClassDesc": "T3",
+        "RegNo": "TZL9999",
+        "UserID": "377",
+        "ClubUserID": "5552",
+        "Name": "Balboa Rocky",
+        "SI": "980377",
+        "Licence": "C",
+        "RequestedStart": "",
+        "RentSI": "1",
+        "Note": "",
+        "ClubNote": "",
+        "Fee": "160",
+        "EntryStop": "0",
+        "CreatedDateTime": "2020-10-02 08:01:11",
+        "CreatedByUserID": "377",
+        "UpdatedDateTime": "2020-10-03 09:30:00",
+        "UpdatedByUserID": "377"
+    }
+}
@@ -1,10 +1,28 @@
+import threading
+import time
+from datetime import timedelta
 from unittest import mock
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+from requests import RequestException
 
-from orienteering_accounts.event.models import Event
+from orienteering_accounts.event.models import Event, EventEntriesData
 from orienteering_accounts.event.tests import fixtures
+from orienteering_accounts.oris.client import ORISClient
+from orienteering_accounts.oris.models import Entry as ORISEntry
+
+
+def upcoming_events_response_data():
+    event_dict = dict(fixtures.ORIS_EVENTS_RESPONSE_DATA['Event_5712'])
+    event_dict['Date'] = (timezone.now().date() + timedelta(days=7)).isoformat()
+    return {'Event_5712': event_dict}
+
+
+def parse_entries(response_data):
+    return [ORISEntry(**entry_dict) for entry_dict in response_data.values()]
 
 
 class ImportTestCase(TestCase):
@@ -15,3 +33,122 @@ class ImportTestCase(TestCase):
         call_command('import_events_from_oris')
         mock_get_events.assert_called()
         self.assertEquals(Event.objects.count(), 1)
+
+    def test_import_upcoming_event_entries(self):
+        account = baker.make('account.Account', oris_id=390, registration_number='TZL6666')
+        responses = {
+            'getEventList': upcoming_events_response_data(),
+            'getEventEntries': fixtures.ORIS_EVENT_ENTRIES_RESPONSE_DATA,
+            'getEventServiceEntries': {},
+        }
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.make_get_request',
+                        side_effect=lambda endpoint, *args, **kwargs: responses[endpoint]) as mock_get_request:
+            Event.import_from_oris()
+
+        event = Event.objects.get()
+        self.assertTrue(event.handled)
+        self.assertEqual(list(event.entries.values_list('account_id', flat=True)), [account.pk])
+        requested_endpoints = [call.args[0] for call in mock_get_request.call_args_list]
+        self.assertEqual(requested_endpoints.count('getEventList'), 3)
+        self.assertEqual(requested_endpoints.count('getEventEntries'), 1)
+
+    def test_incremental_import_skips_unchanged_events(self):
+        responses = {
+            'getEventList': upcoming_events_response_data(),
+            'getEventEntries': {},
+            'getEventServiceEntries': {},
+        }
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.make_get_request',
+                        side_effect=lambda endpoint, *args, **kwargs: responses[endpoint]) as mock_get_request:
+            Event.import_from_oris(incremental=True)
+            self.assertEqual(mock_get_request.call_count, 3 + 2)
+
+            mock_get_request.reset_mock()
+            Event.import_from_oris(incremental=True)
+            self.assertEqual(mock_get_request.call_count, 3)
+
+            responses['getEventList']['Event_5712']['ClassesLastModifiedTimeStamp'] += 1
+            mock_get_request.reset_mock()
+            Event.import_from_oris(incremental=True)
+            self.assertEqual(mock_get_request.call_count, 3 + 2)
+
+        self.assertEqual(Event.objects.get().oris_classes_last_modified_timestamp, 1601400338)
+
+    @override_settings(ORIS_IMPORT_CONCURRENCY=2)
+    def test_fetch_entries_from_oris_limits_concurrency_and_skips_failed_events(self):
+        events = baker.make('event.Event', _quantity=6)
+        in_flight = []
+        max_in_flight = []
+        lock = threading.Lock()
+
+        def fetch_entries_data(event):
+            with lock:
+                in_flight.append(event)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.remove(event)
+            if event == events[2]:
+                raise RequestException()
+            return EventEntriesData(entries=[], additional_services={}, club_entry_exists=None)
+
+        with mock.patch.object(Event, 'fetch_entries_data', autospec=True, side_effect=fetch_entries_data), \
+                self.assertLogs('orienteering_accounts.event.models', level='ERROR'):
+            fetched_events = [event for event, _ in Event.fetch_entries_from_oris(events)]
+
+        self.assertEqual(fetched_events, events[:2] + events[3:])
+        self.assertLessEqual(max(max_in_flight), 2)
+
+    def test_incremental_import_refetches_entries_which_failed(self):
+        responses = {
+            'getEventList': upcoming_events_response_data(),
+            'getEventEntries': {},
+            'getEventServiceEntries': {},
+        }
+        failures = [RequestException()]
+
+        def make_get_request(endpoint, *args, **kwargs):
+            if endpoint == 'getEventEntries' and failures:
+                raise failures.pop()
+            return responses[endpoint]
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.make_get_request', side_effect=make_get_request) as mock_get_request, \
+                self.assertLogs('orienteering_accounts.event.models', level='ERROR'):
+            Event.import_from_oris(incremental=True)
+            self.assertIsNone(Event.objects.get().oris_version)
+
+            mock_get_request.reset_mock()
+            Event.import_from_oris(incremental=True)
+
+        requested_endpoints = [call.args[0] for call in mock_get_request.call_args_list]
+        self.assertEqual(requested_endpoints.count('getEventEntries'), 1)
+        self.assertIsNotNone(Event.objects.get().oris_version)
+
+    def test_update_entries_upserts_and_removes_stale_entries(self):
+        event = baker.make('event.Event', oris_id=5712)
+        account = baker.make('account.Account', oris_id=390, registration_number='TZL6666')
+        stale_entry = baker.make('entry.Entry', event=event, oris_id=1)
+        existing_entry = baker.make('entry.Entry', event=event, account=account, oris_id=None, fee=10)
+
+        with self.assertLogs('orienteering_accounts.entry.models', level='WARNING') as logs:
+            event.update_entries(parse_entries(fixtures.ORIS_EVENT_ENTRIES_RESPONSE_DATA), {})
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(list(event.entries.values_list('pk', 'fee', 'oris_id')), [(existing_entry.pk, 80, 1830201)])
+        self.assertFalse(event.entries.filter(pk=stale_entry.pk).exists())
+
+    def test_bulk_upsert_keeps_fields_missing_in_event_list(self):
+        event = baker.make('event.Event', oris_id=5712, categories_data={'Class_1': {'Name': 'H21'}}, handled=True)
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.make_get_request',
+                        return_value=fixtures.ORIS_EVENTS_RESPONSE_DATA):
+            oris_events = ORISClient.get_events()
+
+        with self.assertNumQueries(2):
+            instances = Event.bulk_upsert_from_oris(oris_events)
+
+        self.assertEqual([instance.pk for instance in instances], [event.pk])
+        self.assertEqual(instances[0].name, 'Oblastní žebříček')
+        self.assertEqual(instances[0].categories_data, {'Class_1': {'Name': 'H21'}})
+        self.assertTrue(instances[0].handled)
@@ -1,12 +1,18 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from unittest import mock
 
 from django.conf import settings
 from django.test import TestCase
 from django.core.management import call_command
+from django.utils import timezone
+from freezegun import freeze_time
+from model_bakery import baker
+from requests import RequestException
 
 from orienteering_accounts.event.models import Event
 from orienteering_accounts.event.tests import fixtures
+from orienteering_accounts.oris.models import Result
+from orienteering_accounts.result.models import Result as ResultModel
 
 
 class RefreshTestCase(TestCase):
@@ -32,3 +38,91 @@ class RefreshTestCase(TestCase):
                 #self.assertIsNotNone(event.categories_data)
                 ## TODO update when there will be more data processing in update
                 #self.assertNotEqual(event.categories_data, {})
+
+    def test_refresh_results_from_oris(self):
+        today = timezone.now().date()
+        event = baker.make('event.Event', handled=True, date=today - timedelta(days=1))
+        baker.make('event.Event', handled=True, date=today + timedelta(days=1))
+        baker.make('event.Event', handled=True, date=today - timedelta(days=1), processing_state=Event.ProcessingType.BILLS_SOLVED)
+        baker.make('result.Result', event=event, registration_number='TZL1111', time='DNS')
+
+        results = {
+            'TZL6666': Result(ClassDesc='H21', RegNo='TZL6666', Time='55:00'),
+            'TZL9999': Result(ClassDesc='D21', RegNo='TZL9999', Time='DNS'),
+        }
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.get_event_results', return_value=results) as mock_get_event_results:
+            Event.refresh_results_from_oris()
+
+        mock_get_event_results.assert_called_once_with(event.oris_id)
+        self.assertEqual(
+            set(event.event_results.values_list('registration_number', 'class_name', 'time')),
+            {('TZL6666', 'H21', '55:00'), ('TZL9999', 'D21', 'DNS')}
+        )
+        self.assertFalse(event.did_not_start('TZL6666'))
+        self.assertTrue(event.did_not_start('TZL9999'))
+
+    @mock.patch('orienteering_accounts.event.models.Event.refresh_from_oris')
+    @mock.patch('orienteering_accounts.event.models.Event.import_from_oris')
+    def test_process_events_stores_results(self, *mocks):
+        event = baker.make('event.Event', handled=True, date=timezone.now().date() - timedelta(days=1))
+        results = {'TZL6666': Result(ClassDesc='H21', RegNo='TZL6666', Time='55:00')}
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.get_event_results', return_value=results):
+            call_command('process_events')
+
+        self.assertEqual(list(event.event_results.values_list('registration_number', 'time')), [('TZL6666', '55:00')])
+        event.refresh_from_db()
+        self.assertIsNotNone(event.results_updated_at)
+
+    def test_refresh_results_from_oris_continues_after_failed_event(self):
+        yesterday = timezone.now().date() - timedelta(days=1)
+        failing_event, event = baker.make('event.Event', handled=True, date=yesterday, _quantity=2)
+        results = {'TZL6666': Result(ClassDesc='H21', RegNo='TZL6666', Time='55:00')}
+
+        def get_event_results(event_id):
+            if event_id == failing_event.oris_id:
+                raise RequestException()
+            return results
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.get_event_results', side_effect=get_event_results):
+            self.assertEqual(Event.refresh_results_from_oris(), 1)
+
+        self.assertFalse(failing_event.event_results.exists())
+        self.assertEqual(list(event.event_results.values_list('registration_number', flat=True)), ['TZL6666'])
+
+    def test_update_results_is_atomic(self):
+        event = baker.make('event.Event', handled=True, date=timezone.now().date() - timedelta(days=1))
+        baker.make('result.Result', event=event, registration_number='TZL1111', time='DNS')
+        results = {'TZL6666': Result(ClassDesc='H21', RegNo='TZL6666', Time='55:00')}
+
+        with mock.patch.object(Event, 'save', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            event.update_results(results)
+
+        self.assertEqual(list(event.event_results.values_list('registration_number', flat=True)), ['TZL1111'])
+
+    def test_update_event_results_polls_until_results_are_stable(self):
+        event = baker.make('event.Event', handled=True, date=date(2026, 5, 1))
+        results = {'TZL6666': Result(ClassDesc='H21', RegNo='TZL6666', Time='DISK')}
+
+        def update_event_results(now: str) -> mock.Mock:
+            with freeze_time(now), mock.patch('orienteering_accounts.oris.client.ORISClient.get_event_results',
+                                              return_value=results) as mock_get_event_results:
+                call_command('update_event_results')
+            event.refresh_from_db()
+            return mock_get_event_results
+
+        update_event_results('2026-05-02 08:00').assert_called_once()
+        self.assertEqual(event.event_results.get().status, ResultModel.Status.DISQUALIFIED)
+        self.assertFalse(event.results_stable)
+
+        # Polled again only after refresh interval
+        update_event_results('2026-05-02 08:30').assert_not_called()
+        update_event_results('2026-05-02 09:00').assert_called_once()
+        self.assertFalse(event.results_stable)
+
+        update_event_results('2026-05-03 08:00').assert_called_once()
+        self.assertTrue(event.results_stable)
+        self.assertEqual(event.results_changed_at, datetime(2026, 5, 2, 8, tzinfo=timezone.utc))
+
+        update_event_results('2026-05-03 10:00').assert_not_called()
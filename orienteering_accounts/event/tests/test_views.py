@@ -0,0 +1,146 @@
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib import messages
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+
+from orienteering_accounts.account.models import Transaction
+from orienteering_accounts.entry.fees import EntryFeeCalculator
+from orienteering_accounts.event.models import Event
+from orienteering_accounts.result.models import Result
+
+
+
+class EventBillsTestCase(TestCase):
+
+    def setUp(self):
+        self.leader = baker.make('account.Account', leader_key=uuid.uuid4())
+        self.event = baker.make(
+            'event.Event',
+            leader=self.leader,
+            discipline={'oris_id': 1},
+            categories_data={'1': {'Name': 'H21', 'Fee': 200}, '2': {'Name': 'D10', 'Fee': 100}}
+        )
+
+    def make_entry(self, registration_number: str, born_year: int, category_name: str, fee: int, time: str = None, **kwargs):
+        account = baker.make('account.Account', registration_number=registration_number, born_year=born_year)
+        if time:
+            baker.make('result.Result', event=self.event, registration_number=registration_number, class_name=category_name,
+                       time=time, status=Result.get_status(time))
+        return baker.make('entry.Entry', account=account, event=self.event, category_name=category_name, fee=fee,
+                          additional_services=[], **kwargs)
+
+    def get_bills(self):
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.make_get_request') as mock_get_request:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('events:bills', args=[self.event.pk, self.leader.leader_key]))
+
+        self.assertEqual(response.status_code, 200)
+        mock_get_request.assert_not_called()
+        return response, len(context)
+
+    def test_bills_initial_debts(self):
+        adult = self.make_entry('ABC8001', 80, 'H21', 250, time='55:00')
+        child = self.make_entry('ABC1501', 15, 'D10', 100, time='30:00')
+        did_not_start = self.make_entry('ABC8002', 80, 'H21', 200, time='DNS')
+        not_in_results = self.make_entry('ABC8003', 80, 'H21', 200)
+        already_billed = self.make_entry('ABC8004', 80, 'H21', 200, time='60:00', debt=Decimal('42'))
+
+        response, _ = self.get_bills()
+        initial_debts = {form.instance.pk: form.initial['debt'] for form in response.context['formset']}
+
+        self.assertEqual(initial_debts, {
+            adult.pk: Decimal('150'),
+            child.pk: Decimal('0'),
+            did_not_start.pk: Decimal('200'),
+            not_in_results.pk: Decimal('200'),
+            already_billed.pk: Decimal('42'),
+        })
+        self.assertEqual(EntryFeeCalculator(self.event).get_entry_fee(adult).debt_init, initial_debts[adult.pk])
+
+    def test_bills_warn_results_not_imported_yet(self):
+        self.make_entry('ABC8001', 80, 'H21', 200)
+
+        response, _ = self.get_bills()
+
+        self.assertEqual(response.context['formset'][0].initial['debt'], Decimal('200'))
+        self.assertEqual([message.level for message in response.context['messages']], [messages.WARNING])
+        self.assertFalse(self.event.event_results.exists())
+
+        self.make_entry('ABC8002', 80, 'H21', 200, time='55:00')
+        response, _ = self.get_bills()
+        self.assertFalse(list(response.context['messages']))
+
+    def test_bills_queries_count_does_not_depend_on_entries_count(self):
+        self.make_entry('ABC8001', 80, 'H21', 200, time='55:00')
+        _, queries_count = self.get_bills()
+
+        for i in range(10):
+            self.make_entry(f'ABC90{i:02}', 90, 'H21', 200, time='DNS')
+        _, more_entries_queries_count = self.get_bills()
+
+        self.assertEqual(more_entries_queries_count, queries_count)
+
+    def post_bills(self, debts: dict):
+        data = {
+            'form-TOTAL_FORMS': len(debts),
+            'form-INITIAL_FORMS': len(debts),
+        }
+        for i, (entry, (debt, other_debt, debt_note)) in enumerate(debts.items()):
+            data.update({
+                f'form-{i}-id': entry.pk,
+                f'form-{i}-debt': debt,
+                f'form-{i}-other_debt': other_debt,
+                f'form-{i}-debt_note': debt_note,
+            })
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('events:bills', args=[self.event.pk, self.leader.leader_key]), data)
+
+        self.assertRedirects(response, reverse('events:bills_success', args=[self.event.pk, self.leader.leader_key]))
+        return len(context)
+
+    def get_entry_transactions(self, entry) -> set:
+        return set(entry.transactions.values_list('account_id', 'purpose', 'amount', 'note'))
+
+    def test_bills_post_saves_transactions(self):
+        adult = self.make_entry('ABC8001', 80, 'H21', 200, time='55:00')
+        child = self.make_entry('ABC1501', 15, 'D10', 100, time='30:00', debt=Decimal('10'), other_debt=Decimal('50'), debt_note='Ubytování')
+        baker.make('account.Transaction', origin_entry=child, account=child.account, purpose=Transaction.TransactionPurpose.ENTRY, amount=Decimal('-10'))
+        baker.make('account.Transaction', origin_entry=child, account=child.account, purpose=Transaction.TransactionPurpose.ENTRY_OTHER,
+                   amount=Decimal('-50'), note='Ubytování')
+
+        self.post_bills({
+            adult: ('100', '30', 'Doprava'),
+            child: ('20', '0', ''),
+        })
+
+        entry = Transaction.TransactionPurpose.ENTRY
+        entry_other = Transaction.TransactionPurpose.ENTRY_OTHER
+        self.assertEqual(self.get_entry_transactions(adult), {
+            (adult.account_id, entry, Decimal('-100'), ''),
+            (adult.account_id, entry_other, Decimal('-30'), 'Doprava'),
+        })
+        self.assertEqual(self.get_entry_transactions(child), {(child.account_id, entry, Decimal('-20'), '')})
+
+        adult.refresh_from_db()
+        child.refresh_from_db()
+        self.assertEqual((adult.debt, adult.other_debt, adult.debt_note), (Decimal('100'), Decimal('30'), 'Doprava'))
+        self.assertEqual(adult.account.balance, Decimal('-130'))
+        self.assertEqual(child.account.balance, Decimal('-20'))
+
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.bills_solved)
+        self.assertEqual(self.event.processing_state, Event.ProcessingType.BILLS_SOLVED)
+
+    def test_bills_post_queries_count_does_not_depend_on_entries_count(self):
+        entries = [self.make_entry(f'ABC80{i:02}', 80, 'H21', 200) for i in range(2)]
+        queries_count = self.post_bills({entry: ('100', '30', 'Doprava') for entry in entries})
+
+        entries += [self.make_entry(f'ABC90{i:02}', 90, 'H21', 200) for i in range(10)]
+        self.assertEqual(self.post_bills({entry: ('150', '0', '') for entry in entries}), queries_count)
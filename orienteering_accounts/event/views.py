@@ -3,7 +3,6 @@ from datetime import timedelta
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.utils import timezone
 from django.views import View
 from django.views.generic import ListView, DetailView
 from django_filters.views import FilterView
@@ -90,24 +89,28 @@ class EventBills(View):
 
         entries_qs = event.entries.order_by('account__registration_number')
 
+        if not event.results:
+            messages.add_message(
+                request,
+                messages.WARNING,
+                _('Výsledky závodu zatím nebyly naimportovány z ORIS, nestartující nelze rozpoznat.')
+            )
+
         return render(request, 'event/event_bills.html', {
             'event': event,
             'formset': EventEntryBillFormSet(
-                queryset=entries_qs
+                queryset=entries_qs,
+                event=event
             )
         })
 
     def post(self, request, pk, key):
         event = get_object_or_404(Event, pk=pk)
 
-        formset = EventEntryBillFormSet(request.POST, queryset=event.entries.all())
+        formset = EventEntryBillFormSet(request.POST, queryset=event.entries.all(), event=event)
 
         if formset.is_valid():
-            formset.save()
-            event.bills_solved = True
-            event.processing_state = Event.ProcessingType.BILLS_SOLVED
-            event.bills_solved_at = timezone.now()
-            event.save(update_fields=['processing_state', 'bills_solved', 'bills_solved_at'])
+            event.solve_bills(formset.save(commit=False))
 
             return HttpResponseRedirect(reverse('events:bills_success', args=[event.pk, key]))
 
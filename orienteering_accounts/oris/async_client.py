@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import random
+import typing
+import weakref
+from datetime import date
+
+import httpx
+import ijson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from orienteering_accounts.oris import choices as oris_choices
+from orienteering_accounts.oris.client import ORISClient, RETRY_METHODS
+from orienteering_accounts.oris.decoding import decode
+from orienteering_accounts.oris.throttling import get_throttle
+from orienteering_accounts.oris.models import RegisteredUser, Event, EventBalance, Result, BaseEntry, ClubMember, ClubRoster
+
+logger = logging.getLogger(__name__)
+
+
+class _AsyncResponseReader:
+    """ File-like adapter of streamed httpx response for ijson """
+
+    def __init__(self, response: httpx.Response):
+        self._chunks = response.aiter_bytes()
+
+    async def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            # ijson probes the stream type with read(0)
+            return b''
+
+        # Empty chunk means EOF for ijson, so empty chunks yielded by httpx are skipped
+        async for chunk in self._chunks:
+            if chunk:
+                return chunk
+        return b''
+
+
+class AsyncORISClient:
+    """
+    Asynchronous counterpart of ORISClient with the same methods returning the same models.
+    All requests made from one event loop share a single keep-alive connection pool.
+    Responses are not cached.
+    """
+
+    _clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def create_client(cls) -> httpx.AsyncClient:
+        # Limits of the client are ignored when transport is given, so they are set on the transport
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.ORIS_API_READ_TIMEOUT, connect=settings.ORIS_API_CONNECT_TIMEOUT),
+            # Retries are made by make_request only, so they are not multiplied by retries of the transport
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=settings.ORIS_API_POOL_SIZE,
+                    max_keepalive_connections=settings.ORIS_API_POOL_SIZE
+                )
+            )
+        )
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = cls._clients.get(loop)
+        if client is None or client.is_closed:
+            client = cls._clients[loop] = cls.create_client()
+        return client
+
+    @classmethod
+    async def close_client(cls):
+        client = cls._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    @classmethod
+    async def make_request(cls, method: str, endpoint: str, params: dict = None, data: dict = None, **kwargs):
+        """
+        Same retries as ORISClient: rate limited requests wait for Retry-After, connection errors are retried
+        with jittered backoff, server errors and errors of sent requests only for RETRY_METHODS.
+        """
+        params = ORISClient.get_request_params(endpoint, params)
+        throttle = get_throttle(endpoint)
+        retry_sent_requests = method.upper() in RETRY_METHODS
+
+        for attempt in range(settings.ORIS_API_MAX_RETRIES + 1):
+            last_attempt = attempt == settings.ORIS_API_MAX_RETRIES
+
+            try:
+                async with throttle.acquire_async():
+                    response = await cls.get_client().request(method.upper(), settings.ORIS_API_URL, params=params, json=data, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # Request was not sent, so it is safe to retry any method
+                if last_attempt:
+                    raise
+                await cls.sleep_backoff(attempt)
+                continue
+            except httpx.TransportError:
+                if last_attempt or not retry_sent_requests:
+                    raise
+                await cls.sleep_backoff(attempt)
+                continue
+
+            if last_attempt:
+                break
+
+            if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+                retry_after = ORISClient.get_retry_after(response, attempt)
+                logger.warning(f'ORIS method {endpoint} is rate limited, pausing it for {retry_after} s')
+                throttle.pause(retry_after)
+            elif response.status_code in settings.ORIS_API_RETRY_STATUSES and retry_sent_requests:
+                await cls.sleep_backoff(attempt)
+            else:
+                break
+
+        response.raise_for_status()
+
+        if not response.content:
+            return None
+
+        return response.json()['Data']
+
+    @classmethod
+    async def sleep_backoff(cls, attempt: int):
+        backoff_time = settings.ORIS_API_RETRY_BACKOFF_FACTOR * (2 ** attempt)
+        await asyncio.sleep(backoff_time + random.uniform(0, settings.ORIS_API_RETRY_BACKOFF_JITTER))
+
+    @classmethod
+    async def make_get_request(cls, endpoint, params: dict = None, **kwargs):
+        response_data = await cls.make_request('GET', endpoint, params=params, **kwargs)
+
+        if endpoint in settings.ORIS_API_CACHE_INVALIDATED_BY:
+            # Cache of the synchronous client is no longer valid, cache is not called from the event loop
+            await sync_to_async(ORISClient.invalidate_cache_after_write)(endpoint)
+
+        return response_data
+
+    @classmethod
+    async def make_streamed_get_request(cls, endpoint: str, params: dict = None, **kwargs) -> typing.AsyncIterator[typing.Tuple[str, typing.Any]]:
+        params = ORISClient.get_request_params(endpoint, params)
+        async with get_throttle(endpoint).acquire_async(), cls.get_client().stream('GET', settings.ORIS_API_URL, params=params, **kwargs) as response:
+            response.raise_for_status()
+            async for item in ijson.kvitems_async(_AsyncResponseReader(response), 'Data'):
+                yield item
+
+    @classmethod
+    async def get_registered_users(cls, year: int = None, sport: int = oris_choices.SPORT_OB, club_id: int = settings.CLUB_ID) -> typing.List[RegisteredUser]:
+        return [registered_user async for registered_user in cls.iter_registered_users(year=year, sport=sport, club_id=club_id)]
+
+    @classmethod
+    async def iter_registered_users(cls, year: int = None, sport: int = oris_choices.SPORT_OB, club_id: int = settings.CLUB_ID) -> typing.AsyncIterator[RegisteredUser]:
+        params = {
+            'year': year or date.today().year,
+            'sport': sport
+        }
+
+        async for reg_id, registered_user_dict in cls.make_streamed_get_request('getRegistration', params=params):
+            registered_user = ORISClient.parse_registered_user(registered_user_dict, club_id=club_id)
+            if registered_user:
+                yield registered_user
+
+    @classmethod
+    async def get_events(cls, sport: int = oris_choices.SPORT_OB, include_unofficial_events=0) -> typing.List[Event]:
+        params = {
+            'sport': sport,
+            'all': include_unofficial_events
+        }
+        response_data = await cls.make_get_request('getEventList', params=params)
+
+        return ORISClient.parse_events(response_data)
+
+    @classmethod
+    async def get_event(cls, event_id: int) -> Event:
+        params = {
+            'id': event_id
+        }
+        response_data = await cls.make_get_request('getEvent', params=params)
+
+        return decode(Event, response_data)
+
+    @classmethod
+    async def get_event_entries(cls, event_id: int, club_id: int = settings.CLUB_ID) -> typing.List[BaseEntry]:
+        params = {
+            'eventid': event_id,
+            'clubid': club_id,
+            'username': settings.ORIS_API_USERNAME,
+            'password': settings.ORIS_API_PASSWORD
+        }
+        response_data = await cls.make_get_request('getEventEntries', params=params)
+
+        return ORISClient.parse_event_entries(response_data)
+
+    @classmethod
+    async def club_entry_exists(cls, event_id: int, club_id: int = settings.CLUB_ID) -> bool:
+        params = {
+            'eventid': event_id,
+            'clubid': club_id,
+            'username': settings.ORIS_API_USERNAME,
+            'password': settings.ORIS_API_PASSWORD
+        }
+        response_data = await cls.make_get_request('getEventEntries', params=params)
+
+        return bool(response_data)
+
+    @classmethod
+    async def get_event_results(cls, event_id: int, club_id: int = settings.CLUB_ID) -> typing.Dict[str, Result]:
+        params = {
+            'eventid': event_id,
+            'clubid': club_id
+        }
+        response_data = await cls.make_get_request('getEventResults', params=params)
+
+        return ORISClient.parse_event_results(response_data)
+
+    @classmethod
+    async def get_event_additional_services(cls, event_id: int, club_id: int = settings.CLUB_ID) -> typing.Dict[int, typing.List]:
+        params = {
+            'eventid': event_id,
+            'clubid': club_id
+        }
+        response_data = await cls.make_get_request('getEventServiceEntries', params=params)
+
+        return ORISClient.parse_event_additional_services(response_data)
+
+    @classmethod
+    async def set_club_entry_rights(cls, user_id: int, club_key: int = settings.CLUB_KEY, can_entry_self: bool = None, can_entry_others: bool = None):
+        params = {
+            'clubuser': user_id,
+            'clubkey': club_key
+        }
+
+        if can_entry_self is not None:
+            params.update(self=int(can_entry_self), other=0)
+
+        response_data = await cls.make_get_request('setClubEntryRights', params=params)
+        ORISClient.set_club_roster(club_key, None)
+
+        return response_data
+
+    @classmethod
+    async def get_club_event_balance(cls, event_id: int, club_id: int = settings.CLUB_ID) -> typing.Optional[EventBalance]:
+        params = {
+            'eventid': event_id
+        }
+        response_data = await cls.make_get_request('getEventBalance', params=params)
+
+        return ORISClient.parse_club_event_balance(response_data, club_id=club_id)
+
+    @classmethod
+    async def get_club_roster(cls, club_key: int = settings.CLUB_KEY, max_age: float = None) -> ClubRoster:
+        """ Shares the roster snapshot with ORISClient.get_club_roster(), see there """
+        max_age = settings.ORIS_CLUB_ROSTER_MAX_AGE if max_age is None else max_age
+        club_roster = ORISClient.get_stored_club_roster(club_key, max_age)
+
+        if club_roster is not None:
+            return club_roster
+
+        params = {
+            'clubkey': club_key
+        }
+        response_data = await cls.make_get_request('getClubUserList', params=params)
+
+        club_roster = ORISClient.parse_club_roster(response_data)
+        ORISClient.set_club_roster(club_key, club_roster)
+
+        return club_roster
+
+    @classmethod
+    async def get_club_member(cls, user_id: str, club_key: int = settings.CLUB_KEY) -> typing.Optional[ClubMember]:
+        """ Same as ORISClient.get_club_member(), missing member refetches the roster at most once per ORIS_CLUB_ROSTER_MAX_AGE """
+        club_member = (await cls.get_club_roster(club_key=club_key)).get_member(user_id)
+
+        if club_member is None and ORISClient.should_refetch_club_roster(club_key):
+            club_member = (await cls.get_club_roster(club_key=club_key, max_age=0)).get_member(user_id)
+
+        return club_member
@@ -1,24 +1,113 @@
 from collections import defaultdict
 
+import hashlib
+import json
+import random
+import threading
+import time
+
+import ijson
 import requests
 import typing
 import logging
 
 from django.conf import settings
+from django.core.cache import cache
 from datetime import date
+from urllib.parse import parse_qs, urlsplit
 
 from pydantic import ValidationError
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
 
 from orienteering_accounts.oris import choices as oris_choices
-from orienteering_accounts.oris.models import RegisteredUser, Event, Entry, EventBalance, Result, LegEntry, BaseEntry, ClubMember
+from orienteering_accounts.oris.coalescing import SingleFlight, cache_lock
+from orienteering_accounts.oris.decoding import decode
+from orienteering_accounts.oris.throttling import get_throttle, get_throttle_stats
+from orienteering_accounts.oris.models import RegisteredUser, Event, Entry, EventBalance, Result, LegEntry, BaseEntry, ClubMember, \
+    ClubRoster
 
 logger = logging.getLogger(__name__)
 
 
+# Methods retried after server errors and errors of sent requests, others may have been processed by ORIS
+RETRY_METHODS = frozenset(['GET', 'PUT'])
+
+
+class JitteredRetry(Retry):
+    """
+    Exponential backoff with random jitter, so parallel workers don't retry in lockstep.
+    Retries are made within the request holding its throttle, each retry is counted against the rate limit
+    of the ORIS method as well, so retries of failing requests don't exceed it.
+    """
+
+    def increment(self, method=None, url=None, *args, **kwargs) -> 'JitteredRetry':
+        retry = super().increment(method, url, *args, **kwargs)
+
+        endpoint = parse_qs(urlsplit(url or '').query).get('method')
+        if endpoint:
+            get_throttle(endpoint[0]).wait()
+
+        return retry
+
+    def get_backoff_time(self) -> float:
+        backoff_time = super().get_backoff_time()
+        if not self.history:
+            return backoff_time
+        return backoff_time + random.uniform(0, settings.ORIS_API_RETRY_BACKOFF_JITTER)
+
+
 class ORISClient:
 
+    _session: typing.Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+    _club_rosters: typing.Dict[int, ClubRoster] = {}
+    # Monotonic time of last refetch of club roster caused by missing member
+    _club_rosters_refetched: typing.Dict[int, float] = {}
+    _club_rosters_lock = threading.Lock()
+    _single_flight = SingleFlight()
+
     @classmethod
-    def make_request(cls, method: str, endpoint: str, params: dict = None, data: dict = None, **kwargs):
+    def create_session(cls) -> requests.Session:
+        retry = JitteredRetry(
+            total=settings.ORIS_API_MAX_RETRIES,
+            backoff_factor=settings.ORIS_API_RETRY_BACKOFF_FACTOR,
+            status_forcelist=settings.ORIS_API_RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.ORIS_API_POOL_SIZE,
+            pool_block=True,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """ Shared keep-alive session, connections are pooled across all ORIS requests of the process """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    cls._session = cls.create_session()
+        return cls._session
+
+    @classmethod
+    def close_session(cls):
+        with cls._session_lock:
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
+
+    @classmethod
+    def get_request_params(cls, endpoint: str, params: dict = None) -> dict:
         default_params = {
             'format': 'json',
             'method': endpoint
@@ -27,10 +116,43 @@ class ORISClient:
         if params:
             default_params.update(**params)
 
-        params = default_params
-        request_func = getattr(requests, method.lower())
+        return default_params
+
+    @classmethod
+    def get_retry_after(cls, response: requests.Response, attempt: int) -> float:
+        """ Seconds to wait after ORIS responded with 429, Retry-After header is honored when present """
+        retry_after = settings.ORIS_API_RETRY_BACKOFF_FACTOR * (2 ** attempt)
+
+        if response.headers.get('Retry-After'):
+            try:
+                retry_after = Retry.DEFAULT.parse_retry_after(response.headers['Retry-After'])
+            except InvalidHeader:
+                pass
+
+        return min(retry_after, settings.ORIS_API_RETRY_AFTER_MAX)
+
+    @classmethod
+    def get_throttle_stats(cls) -> typing.Dict[str, dict]:
+        """ Number of requests, 429 responses and seconds spent waiting for rate limit per ORIS method """
+        return get_throttle_stats()
+
+    @classmethod
+    def make_request(cls, method: str, endpoint: str, params: dict = None, data: dict = None, **kwargs):
+        params = cls.get_request_params(endpoint, params)
+        kwargs.setdefault('timeout', (settings.ORIS_API_CONNECT_TIMEOUT, settings.ORIS_API_READ_TIMEOUT))
+        throttle = get_throttle(endpoint)
+
+        for attempt in range(settings.ORIS_API_MAX_RETRIES + 1):
+            with throttle.acquire():
+                response = cls.get_session().request(method.upper(), settings.ORIS_API_URL, params=params, json=data, **kwargs)
+
+            if response.status_code != requests.codes.too_many_requests or attempt == settings.ORIS_API_MAX_RETRIES:
+                break
+
+            retry_after = cls.get_retry_after(response, attempt)
+            logger.warning(f'ORIS method {endpoint} is rate limited, pausing it for {retry_after} s')
+            throttle.pause(retry_after)
 
-        response = request_func(settings.ORIS_API_URL, params=params, json=data, **kwargs)
         response.raise_for_status()
 
         if not response:
@@ -41,8 +163,107 @@ class ORISClient:
         return response_data['Data']
 
     @classmethod
-    def make_get_request(cls, endpoint, params: dict = None, **kwargs):
-        return cls.make_request('GET', endpoint, params=params, **kwargs)
+    def make_streamed_get_request(cls, endpoint: str, params: dict = None, **kwargs) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+        """
+        Parses response incrementally while it is downloaded and yields (key, item) pairs of response Data,
+        so whole response is never held in memory. Responses are not cached.
+        """
+        params = cls.get_request_params(endpoint, params)
+        kwargs.setdefault('timeout', (settings.ORIS_API_CONNECT_TIMEOUT, settings.ORIS_API_READ_TIMEOUT))
+
+        throttle = get_throttle(endpoint)
+
+        with throttle.acquire(), cls.get_session().get(settings.ORIS_API_URL, params=params, stream=True, **kwargs) as response:
+            if response.status_code == requests.codes.too_many_requests:
+                throttle.pause(cls.get_retry_after(response, attempt=0))
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield from ijson.kvitems(response.raw, 'Data')
+
+    @classmethod
+    def make_get_request(cls, endpoint, params: dict = None, use_cache: bool = True, **kwargs):
+        """
+        Identical requests of read-only methods are coalesced, concurrent callers in the process and in other
+        processes share one ORIS call. Response is then cached for ORIS_API_CACHE_TIMEOUTS of the endpoint,
+        or for ORIS_SINGLE_FLIGHT_TIMEOUT of ORIS_SINGLE_FLIGHT_METHODS, so back-to-back requests within a run
+        are shared too. Requests of other methods are never coalesced nor cached.
+        """
+        if not use_cache or not cls.is_cached(endpoint):
+            response_data = cls.make_request('GET', endpoint, params=params, **kwargs)
+            cls.invalidate_cache_after_write(endpoint)
+            return response_data
+
+        cache_key = cls.get_cache_key(endpoint, params)
+
+        return cls._single_flight.do(cache_key, lambda: cls._get_cached_response(cache_key, endpoint, params, **kwargs))
+
+    @classmethod
+    def is_cached(cls, endpoint: str) -> bool:
+        return endpoint in settings.ORIS_API_CACHE_TIMEOUTS or endpoint in settings.ORIS_SINGLE_FLIGHT_METHODS
+
+    @classmethod
+    def _get_cached_response(cls, cache_key: str, endpoint: str, params: dict = None, **kwargs):
+        cached_response = cache.get(cache_key)
+
+        if cached_response is not None:
+            return cached_response['data']
+
+        with cache_lock(cache_key, timeout=settings.ORIS_SINGLE_FLIGHT_LOCK_TIMEOUT):
+            # Other process may have fetched the response while we were waiting for the lock
+            cached_response = cache.get(cache_key)
+
+            if cached_response is not None:
+                return cached_response['data']
+
+            response_data = cls.make_request('GET', endpoint, params=params, **kwargs)
+
+            cache_timeout = settings.ORIS_API_CACHE_TIMEOUTS.get(endpoint, settings.ORIS_SINGLE_FLIGHT_TIMEOUT)
+            if not response_data:
+                # Negative caching, empty responses are kept for shorter time
+                cache_timeout = min(cache_timeout, settings.ORIS_API_NEGATIVE_CACHE_TIMEOUT)
+
+            cache.set(cache_key, {'data': response_data}, timeout=cache_timeout)
+
+        return response_data
+
+    @classmethod
+    def get_cache_key(cls, endpoint: str, params: dict = None) -> str:
+        """
+        Credentials are never part of the key, authenticated requests are however keyed by the username,
+        so their responses are not shared with unauthenticated requests.
+        """
+        params = params or {}
+        key_params = {
+            key: str(value) for key, value in params.items()
+            if key not in settings.ORIS_API_CACHE_EXCLUDED_PARAMS
+        }
+        if any(key in params for key in settings.ORIS_API_CACHE_EXCLUDED_PARAMS):
+            key_params['authenticated_as'] = str(params.get('username', ''))
+        params_hash = hashlib.sha1(json.dumps(key_params, sort_keys=True).encode()).hexdigest()
+        generation = cache.get(cls._get_cache_generation_key(endpoint), 0)
+        return f'oris:{endpoint}:{generation}:{params_hash}'
+
+    @classmethod
+    def _get_cache_generation_key(cls, endpoint: str) -> str:
+        return f'oris:{endpoint}:generation'
+
+    @classmethod
+    def invalidate_cache(cls, endpoint: str, params: dict = None):
+        """ Invalidates cached response for given params or all cached responses of the endpoint """
+        if params is not None:
+            cache.delete(cls.get_cache_key(endpoint, params))
+            return
+
+        generation_key = cls._get_cache_generation_key(endpoint)
+        # Atomic increment, so concurrent invalidations are not lost
+        cache.add(generation_key, 0, timeout=None)
+        cache.incr(generation_key)
+
+    @classmethod
+    def invalidate_cache_after_write(cls, endpoint: str):
+        """ Invalidates cached responses of methods, which data are changed by given ORIS method """
+        for invalidated_endpoint in settings.ORIS_API_CACHE_INVALIDATED_BY.get(endpoint, ()):
+            cls.invalidate_cache(invalidated_endpoint)
 
     @classmethod
     def make_put_request(cls, endpoint, data: dict = None, **kwargs):
@@ -54,20 +275,26 @@ class ORISClient:
 
     @classmethod
     def get_registered_users(cls, year: int = None, sport: int = oris_choices.SPORT_OB, club_id: int = settings.CLUB_ID) -> typing.List[RegisteredUser]:
+        return list(cls.iter_registered_users(year=year, sport=sport, club_id=club_id))
+
+    @classmethod
+    def iter_registered_users(cls, year: int = None, sport: int = oris_choices.SPORT_OB, club_id: int = settings.CLUB_ID) -> typing.Iterator[RegisteredUser]:
+        """ Registrations of the whole federation are streamed, only users of the club are parsed """
         params = {
-            'year': year or date.year,
+            'year': year or date.today().year,
             'sport': sport
         }
-        response_data = cls.make_get_request('getRegistration', params=params)
-
-        registered_users = []
 
-        for reg_id, registered_user_dict in response_data.items():
+        for reg_id, registered_user_dict in cls.make_streamed_get_request('getRegistration', params=params):
+            registered_user = cls.parse_registered_user(registered_user_dict, club_id=club_id)
+            if registered_user:
+                yield registered_user
 
-            if registered_user_dict.get('ClubID') == club_id:
-                registered_users.append(RegisteredUser(**registered_user_dict))
-
-        return registered_users
+    @classmethod
+    def parse_registered_user(cls, registered_user_dict: dict, club_id: int = settings.CLUB_ID) -> typing.Optional[RegisteredUser]:
+        if registered_user_dict.get('ClubID') == club_id:
+            return decode(RegisteredUser, registered_user_dict)
+        return None
 
     @classmethod
     def get_events(cls, sport: int = oris_choices.SPORT_OB, include_unofficial_events=0) -> typing.List[Event]:
@@ -77,12 +304,16 @@ class ORISClient:
         }
         response_data = cls.make_get_request('getEventList', params=params)
 
+        return cls.parse_events(response_data)
+
+    @classmethod
+    def parse_events(cls, response_data) -> typing.List[Event]:
         events = []
 
         if response_data:
             for reg_id, event_dict in response_data.items():
                 try:
-                    events.append(Event(**event_dict))
+                    events.append(decode(Event, event_dict))
                 except ValidationError:
                     logger.warning('Invalid ORIS event, skipping', exc_info=True)
         return events
@@ -94,7 +325,7 @@ class ORISClient:
         }
         response_data = cls.make_get_request('getEvent', params=params)
 
-        return Event(**response_data)
+        return decode(Event, response_data)
 
     @classmethod
     def get_event_entries(cls, event_id: int, club_id: int = settings.CLUB_ID) -> typing.List[BaseEntry]:
@@ -106,30 +337,36 @@ class ORISClient:
         }
         response_data = cls.make_get_request('getEventEntries', params=params)
 
+        return cls.parse_event_entries(response_data)
+
+    @classmethod
+    def parse_event_entries(cls, response_data) -> typing.List[BaseEntry]:
         entries = []
 
         if response_data:
             for entry_id, entry_dict in response_data.items():
                 if entry_dict.get('UserID'):
-                    entries.append(Entry(**entry_dict))
+                    entries.append(decode(Entry, entry_dict))
                 elif entry_dict.get('Legs'):
                     for leg_id, leg_dict in entry_dict.get('Legs', {}).items():
                         entry_dict.update(**leg_dict)
-                        entries.append(LegEntry(**entry_dict))
+                        entries.append(decode(LegEntry, entry_dict))
 
         return entries
 
     @classmethod
     def club_entry_exists(cls, event_id: int, club_id: int = settings.CLUB_ID) -> bool:
+        # Same params as get_event_entries, so both share one ORIS call
         params = {
             'eventid': event_id,
-            'clubid': club_id
+            'clubid': club_id,
+            'username': settings.ORIS_API_USERNAME,
+            'password': settings.ORIS_API_PASSWORD
         }
         response_data = cls.make_get_request('getEventEntries', params=params)
 
         return bool(response_data)
 
-
     @classmethod
     def get_event_results(cls, event_id: int, club_id: int = settings.CLUB_ID) -> typing.Dict[str, Result]:
         params = {
@@ -138,10 +375,14 @@ class ORISClient:
         }
         response_data = cls.make_get_request('getEventResults', params=params)
 
+        return cls.parse_event_results(response_data)
+
+    @classmethod
+    def parse_event_results(cls, response_data) -> typing.Dict[str, Result]:
         results = {}
         if response_data:
             for result_id, result_dict in response_data.items():
-                result = Result(**result_dict)
+                result = decode(Result, result_dict)
                 results[result.registration_number] = result
 
         return results
@@ -154,6 +395,10 @@ class ORISClient:
         }
         response_data = cls.make_get_request('getEventServiceEntries', params=params)
 
+        return cls.parse_event_additional_services(response_data)
+
+    @classmethod
+    def parse_event_additional_services(cls, response_data) -> typing.Dict[int, typing.List]:
         additional_services = defaultdict(list)
 
         if response_data:
@@ -174,7 +419,10 @@ class ORISClient:
         #if can_entry_others is not None:
         #    params.update(other=can_entry_others)
 
-        return cls.make_get_request('setClubEntryRights', params=params)
+        response_data = cls.make_get_request('setClubEntryRights', params=params)
+        cls.set_club_roster(club_key, None)
+
+        return response_data
 
     @classmethod
     def get_club_event_balance(cls, event_id: int, club_id: int = settings.CLUB_ID) -> typing.Optional[EventBalance]:
@@ -183,6 +431,10 @@ class ORISClient:
         }
         response_data = cls.make_get_request('getEventBalance', params=params)
 
+        return cls.parse_club_event_balance(response_data, club_id=club_id)
+
+    @classmethod
+    def parse_club_event_balance(cls, response_data, club_id: int = settings.CLUB_ID) -> typing.Optional[EventBalance]:
         if response_data:
             for _, club_dict in response_data['Clubs'].items():
                 if club_dict['ClubID'] == club_id:
@@ -191,15 +443,78 @@ class ORISClient:
         return None
 
     @classmethod
-    def get_club_member(cls, user_id: str, club_key: int = settings.CLUB_KEY) -> typing.Optional[ClubMember]:
+    def get_club_roster(cls, club_key: int = settings.CLUB_KEY, max_age: float = None) -> ClubRoster:
+        """
+        Returns snapshot of all club members, downloaded once and reused within the process.
+        Snapshot older than max_age seconds (ORIS_CLUB_ROSTER_MAX_AGE by default) is fetched again.
+        """
+        max_age = settings.ORIS_CLUB_ROSTER_MAX_AGE if max_age is None else max_age
+        club_roster = cls.get_stored_club_roster(club_key, max_age)
+
+        if club_roster is not None:
+            return club_roster
+
         params = {
             'clubkey': club_key
         }
-        response_data = cls.make_get_request('getClubUserList', params=params)
+        response_data = cls.make_get_request('getClubUserList', params=params, use_cache=max_age > 0)
+
+        club_roster = cls.parse_club_roster(response_data)
+        cls.set_club_roster(club_key, club_roster)
+
+        return club_roster
+
+    @classmethod
+    def get_stored_club_roster(cls, club_key: int, max_age: float) -> typing.Optional[ClubRoster]:
+        """ Roster snapshot of the process, shared with AsyncORISClient, when it is not older than max_age seconds """
+        with cls._club_rosters_lock:
+            club_roster = cls._club_rosters.get(club_key)
+
+        if club_roster is not None and club_roster.age < max_age:
+            return club_roster
+        return None
+
+    @classmethod
+    def set_club_roster(cls, club_key: int, club_roster: typing.Optional[ClubRoster]):
+        """ Stores roster snapshot of the process, None discards it """
+        with cls._club_rosters_lock:
+            if club_roster is None:
+                cls._club_rosters.pop(club_key, None)
+            else:
+                cls._club_rosters[club_key] = club_roster
+
+    @classmethod
+    def should_refetch_club_roster(cls, club_key: int) -> bool:
+        """ Roster is refetched for missing member at most once per ORIS_CLUB_ROSTER_MAX_AGE, concurrent callers refetch once """
+        with cls._club_rosters_lock:
+            refetched = cls._club_rosters_refetched.get(club_key)
+            if refetched is not None and time.monotonic() - refetched < settings.ORIS_CLUB_ROSTER_MAX_AGE:
+                return False
+            cls._club_rosters_refetched[club_key] = time.monotonic()
+            return True
+
+    @classmethod
+    def parse_club_roster(cls, response_data) -> ClubRoster:
+        members = []
 
         if response_data:
             for _, club_user_dict in response_data['ClubMembers'].items():
-                if club_user_dict['UserID'] == str(user_id):
-                    return ClubMember(**club_user_dict)
+                try:
+                    members.append(decode(ClubMember, club_user_dict))
+                except ValidationError:
+                    logger.warning(f'Invalid ORIS club member {club_user_dict.get("UserID")}, skipping', exc_info=True)
 
-        return None
+        return ClubRoster(members)
+
+    @classmethod
+    def get_club_member(cls, user_id: str, club_key: int = settings.CLUB_KEY) -> typing.Optional[ClubMember]:
+        """
+        Member missing in the snapshot may have joined the club after it was taken, so the roster is fetched again.
+        As non-members are looked up often, missing member refetches the roster at most once per ORIS_CLUB_ROSTER_MAX_AGE.
+        """
+        club_member = cls.get_club_roster(club_key=club_key).get_member(user_id)
+
+        if club_member is None and cls.should_refetch_club_roster(club_key):
+            club_member = cls.get_club_roster(club_key=club_key, max_age=0).get_member(user_id)
+
+        return club_member
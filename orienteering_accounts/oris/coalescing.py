@@ -0,0 +1,69 @@
+import threading
+import typing
+from concurrent.futures import Future
+from contextlib import contextmanager
+from copy import deepcopy
+
+from django.core.cache import cache
+
+T = typing.TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution of the function.
+    The first caller executes it, the others wait for its result and get their own copy of it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: typing.Dict[str, Future] = {}
+
+    def do(self, key: str, func: typing.Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return deepcopy(future.result())
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+@contextmanager
+def cache_lock(key: str, timeout: float) -> typing.Iterator[None]:
+    """
+    Lock shared by all processes using the cache, e.g. gunicorn workers and cron commands.
+    Caches without locking support (e.g. local memory cache) are not locked across processes.
+    Waiting for the lock longer than timeout continues without it.
+    """
+    if not hasattr(cache, 'lock'):
+        yield
+        return
+
+    from redis.exceptions import LockError
+
+    lock = cache.lock(f'{key}:lock', timeout=timeout, blocking_timeout=timeout)
+    acquired = lock.acquire()
+
+    try:
+        yield
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except LockError:
+                # Lock expired in the meantime
+                pass
@@ -0,0 +1,170 @@
+import typing
+from copy import deepcopy
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+
+from django.conf import settings
+from pydantic import BaseModel
+from pydantic.class_validators import make_generic_validator
+from pydantic.datetime_parse import parse_date, parse_datetime
+from pydantic.fields import SHAPE_SINGLETON
+
+Model = typing.TypeVar('Model', bound=BaseModel)
+
+BOOL_VALUES = {
+    True: True, False: False, 1: True, 0: False,
+    '1': True, '0': False, 'true': True, 'false': False, 'True': True, 'False': False,
+}
+
+
+class DecodingError(Exception):
+    pass
+
+
+def _decode_bool(value) -> bool:
+    try:
+        return BOOL_VALUES[value]
+    except (KeyError, TypeError):
+        raise DecodingError(value)
+
+
+def _decode_decimal(value) -> Decimal:
+    return Decimal(str(value))
+
+
+def _decode_str(value) -> str:
+    # Same as pydantic, numbers are converted, anything else is not a string
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    raise DecodingError(value)
+
+
+def _identity(value):
+    return value
+
+
+class ModelDecoder:
+    """
+    Trusted decoding of ORIS payloads. Field aliases, coercions and validators are resolved once per model,
+    decoding then only converts values and constructs the model without pydantic validation machinery.
+    Anything not recognized raises DecodingError, so the caller can fall back to full validation.
+    """
+
+    def __init__(self, model_class: typing.Type[Model]):
+        self.model_class = model_class
+        self.fields = [
+            (
+                field.alias,
+                field.name,
+                self._get_converter(field),
+                field.required,
+                field.default,
+                field.allow_none,
+                [make_generic_validator(validator.func) for validator in field.class_validators.values() if validator.pre],
+                [make_generic_validator(validator.func) for validator in field.class_validators.values() if not validator.pre],
+            )
+            for field in model_class.__fields__.values()
+        ]
+
+    @classmethod
+    def _get_converter(cls, field) -> typing.Callable:
+        if field.shape != SHAPE_SINGLETON:
+            raise DecodingError(f'Unsupported shape of field {field.name}')
+
+        field_type = field.type_
+
+        if field_type is typing.Any:
+            return _identity
+        if isinstance(field_type, type):
+            if issubclass(field_type, BaseModel):
+                return get_decoder(field_type).decode
+            if issubclass(field_type, Enum):
+                return field_type
+            if issubclass(field_type, bool):
+                return _decode_bool
+            if issubclass(field_type, datetime):
+                return parse_datetime
+            if issubclass(field_type, date):
+                return parse_date
+            if issubclass(field_type, Decimal):
+                return _decode_decimal
+            if issubclass(field_type, str):
+                return _decode_str
+            if field_type in (int, float):
+                return field_type
+
+        raise DecodingError(f'Unsupported type of field {field.name}')
+
+    def _validate(self, alias: str, validators: typing.List[typing.Callable], value, values: dict):
+        # Errors pydantic wraps into ValidationError are left to full validation, which raises it
+        try:
+            for validator in validators:
+                value = validator(self.model_class, value, values, None, None)
+        except (ValueError, TypeError, AssertionError):
+            raise DecodingError(f'Invalid value of field {alias}')
+        return value
+
+    def decode(self, data: dict) -> Model:
+        values = {}
+        fields_set = set()
+
+        for alias, name, converter, required, default, allow_none, pre_validators, post_validators in self.fields:
+            if alias in data:
+                value = data[alias]
+                fields_set.add(name)
+            elif required:
+                raise DecodingError(f'Missing field {alias}')
+            else:
+                values[name] = deepcopy(default) if isinstance(default, (dict, list)) else default
+                continue
+
+            value = self._validate(alias, pre_validators, value, values)
+
+            if value is None:
+                if not allow_none:
+                    raise DecodingError(f'Field {alias} can not be empty')
+                values[name] = None
+                continue
+
+            try:
+                value = converter(value)
+            except (TypeError, ValueError, ArithmeticError):
+                raise DecodingError(f'Invalid value of field {alias}')
+
+            values[name] = self._validate(alias, post_validators, value, values)
+
+        # Same as BaseModel.construct(), which would copy defaults of all fields once again
+        instance = self.model_class.__new__(self.model_class)
+        object.__setattr__(instance, '__dict__', values)
+        object.__setattr__(instance, '__fields_set__', fields_set)
+        instance._init_private_attributes()
+        return instance
+
+
+_decoders: typing.Dict[typing.Type[BaseModel], ModelDecoder] = {}
+
+
+def get_decoder(model_class: typing.Type[Model]) -> ModelDecoder:
+    decoder = _decoders.get(model_class)
+    if decoder is None:
+        decoder = _decoders[model_class] = ModelDecoder(model_class)
+    return decoder
+
+
+def decode(model_class: typing.Type[Model], data: dict, trusted: bool = None) -> Model:
+    """
+    Builds ORIS model from the payload. With trusted decoding (ORIS_TRUSTED_DECODING) full pydantic validation
+    is used only as a fallback for payloads the fast path can not decode, which raises proper ValidationError.
+    """
+    trusted = settings.ORIS_TRUSTED_DECODING if trusted is None else trusted
+
+    if trusted:
+        try:
+            return get_decoder(model_class).decode(data)
+        except DecodingError:
+            pass
+
+    return model_class(**data)
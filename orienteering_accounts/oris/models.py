@@ -1,3 +1,4 @@
+import time
 import typing
 
 from datetime import datetime, date
@@ -66,6 +67,29 @@ class ClubMember(BaseModel):
     notify_about_feedback_by_email: int = Field(alias='NotifyAboutFeedbackByEmail')
 
 
+class ClubRoster:
+    """ Snapshot of getClubUserList indexed by ORIS user ID and registration number """
+
+    def __init__(self, members: typing.List[ClubMember]):
+        self.members = members
+        self.by_user_id = {member.user_id: member for member in members}
+        self.by_registration_number = {member.registration_number: member for member in members}
+        self.created = time.monotonic()
+
+    def __len__(self):
+        return len(self.members)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    def get_member(self, user_id: typing.Union[int, str]) -> typing.Optional[ClubMember]:
+        return self.by_user_id.get(int(user_id))
+
+    def get_member_by_registration_number(self, registration_number: str) -> typing.Optional[ClubMember]:
+        return self.by_registration_number.get(registration_number)
+
+
 class Organizer(BaseModel):
     oris_id: int = Field(alias='ID')
     abbr: str = Field(alias='Abbr')
@@ -0,0 +1,129 @@
+import asyncio
+from unittest import mock
+
+import httpx
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from orienteering_accounts.account.tests.test_import import ORIS_REGISTER_USERS_RESPONSE_DATA
+from orienteering_accounts.oris.async_client import AsyncORISClient
+from orienteering_accounts.oris.client import ORISClient
+from orienteering_accounts.oris.tests.test_client import CLUB_USER_LIST_RESPONSE_DATA
+
+
+def mock_transport(responses: dict, requests: list = None) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request)
+        return httpx.Response(200, json={'Data': responses[request.url.params['method']]})
+
+    return httpx.MockTransport(handler)
+
+
+@override_settings(ORIS_API_URL='https://oris.orientacnisporty.cz/API/')
+class AsyncORISClientTestCase(SimpleTestCase):
+
+    def setUp(self):
+        ORISClient._club_rosters.clear()
+        ORISClient._club_rosters_refetched.clear()
+
+    def run_with_transport(self, coroutine_function, responses: dict, requests: list = None):
+        async def run():
+            client = httpx.AsyncClient(transport=mock_transport(responses, requests))
+            with mock.patch.object(AsyncORISClient, 'create_client', return_value=client):
+                try:
+                    return await coroutine_function()
+                finally:
+                    await AsyncORISClient.close_client()
+
+        return asyncio.run(run())
+
+    def test_same_models_as_sync_client(self):
+        roster = self.run_with_transport(AsyncORISClient.get_club_roster, {'getClubUserList': CLUB_USER_LIST_RESPONSE_DATA})
+        self.assertEqual(roster.members, ORISClient.parse_club_roster(CLUB_USER_LIST_RESPONSE_DATA).members)
+
+    def test_concurrent_requests(self):
+        async def get_members():
+            return await asyncio.gather(*[
+                AsyncORISClient.get_club_member(member_dict['UserID']) for member_dict in CLUB_USER_LIST_RESPONSE_DATA['ClubMembers'].values()
+            ])
+
+        members = self.run_with_transport(get_members, {'getClubUserList': CLUB_USER_LIST_RESPONSE_DATA})
+        self.assertTrue(all(members))
+
+    def test_club_roster_is_reused(self):
+        async def get_members():
+            return [await AsyncORISClient.get_club_member(user_id) for user_id in (1, 2, 999, 998)]
+
+        requests = []
+        members = self.run_with_transport(get_members, {'getClubUserList': CLUB_USER_LIST_RESPONSE_DATA}, requests)
+
+        self.assertEqual([member and member.user_id for member in members], [1, 2, None, None])
+        # First snapshot and one refetch for missing member
+        self.assertEqual(len(requests), 2)
+
+    def test_client_pool_size(self):
+        async def get_pool():
+            client = AsyncORISClient.create_client()
+            await client.aclose()
+            return client._transport._pool
+
+        with override_settings(ORIS_API_POOL_SIZE=3):
+            pool = asyncio.run(get_pool())
+
+        self.assertEqual(pool._max_connections, 3)
+        self.assertEqual(pool._max_keepalive_connections, 3)
+        # Requests are retried by the client only
+        self.assertEqual(pool._retries, 0)
+
+    def make_request_with_retries(self, method: str, actions: list) -> list:
+        """ Responds with statuses in order or raises given errors, returns methods of made requests """
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request.method)
+            action = actions.pop(0)
+            if isinstance(action, Exception):
+                raise action
+            return httpx.Response(action, json={'Data': {}})
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with mock.patch.object(AsyncORISClient, 'create_client', return_value=client), \
+                    mock.patch('orienteering_accounts.oris.async_client.asyncio.sleep') as mock_sleep:
+                try:
+                    return await AsyncORISClient.make_request(method, 'getEventEntries')
+                finally:
+                    self.sleeps_count = mock_sleep.call_count
+                    await AsyncORISClient.close_client()
+
+        try:
+            asyncio.run(run())
+        except httpx.HTTPError:
+            pass
+        return requests
+
+    def test_requests_are_retried(self):
+        self.assertEqual(self.make_request_with_retries('GET', [503, httpx.ReadError('reset'), 200]), ['GET'] * 3)
+        self.assertEqual(self.sleeps_count, 2)
+
+        self.assertEqual(self.make_request_with_retries('POST', [httpx.ConnectError('refused'), 200]), ['POST'] * 2)
+
+        # Sent requests of other methods than RETRY_METHODS may have been processed
+        self.assertEqual(self.make_request_with_retries('POST', [503, 200]), ['POST'])
+        self.assertEqual(self.make_request_with_retries('POST', [httpx.ReadError('reset'), 200]), ['POST'])
+
+    def test_connection_errors_are_retried_once_per_attempt(self):
+        actions = [httpx.ConnectError('refused')] * 10
+        requests = self.make_request_with_retries('GET', actions)
+        self.assertEqual(len(requests), settings.ORIS_API_MAX_RETRIES + 1)
+
+    def test_streamed_registered_users(self):
+        async def get_registered_users():
+            return await AsyncORISClient.get_registered_users(year=2020)
+
+        registered_users = self.run_with_transport(get_registered_users, {'getRegistration': ORIS_REGISTER_USERS_RESPONSE_DATA})
+        self.assertEqual(registered_users, [
+            ORISClient.parse_registered_user(user_dict) for user_dict in ORIS_REGISTER_USERS_RESPONSE_DATA.values()
+            if ORISClient.parse_registered_user(user_dict)
+        ])
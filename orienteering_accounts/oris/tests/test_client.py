@@ -0,0 +1,260 @@
+import io
+import json
+import socket
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+
+from orienteering_accounts.account.tests.test_import import ORIS_REGISTER_USERS_RESPONSE_DATA
+from orienteering_accounts.event.tests.fixtures import ORIS_EVENT_ENTRIES_RESPONSE_DATA
+from orienteering_accounts.oris.client import ORISClient
+from orienteering_accounts.oris.throttling import reset_throttles
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ORISClientCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_request', return_value={"ClubMembers": {}})
+    def test_cached_get_request(self, mock_request):
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 1, 'password': 'secret'})
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 1, 'password': 'another'})
+        self.assertEqual(mock_request.call_count, 1)
+
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 3})
+        self.assertEqual(mock_request.call_count, 2)
+
+        ORISClient.invalidate_cache('getClubUserList')
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 1})
+        self.assertEqual(mock_request.call_count, 3)
+
+    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_request', return_value={})
+    def test_uncached_methods(self, mock_request):
+        ORISClient.make_get_request('setClubEntryRights', params={'clubuser': 1})
+        ORISClient.make_get_request('setClubEntryRights', params={'clubuser': 1})
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 1}, use_cache=False)
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 1}, use_cache=False)
+        # Read methods not listed in cached methods are not cached either
+        ORISClient.make_get_request('getUser', params={'rgnum': 'TZL6666'})
+        ORISClient.make_get_request('getUser', params={'rgnum': 'TZL6666'})
+        self.assertEqual(mock_request.call_count, 6)
+
+    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_request', return_value=ORIS_EVENT_ENTRIES_RESPONSE_DATA)
+    def test_back_to_back_requests_are_shared(self, mock_request):
+        with freeze_time('2021-01-01 10:00:00') as frozen_time:
+            self.assertTrue(ORISClient.club_entry_exists(1))
+            self.assertEqual(len(ORISClient.get_event_entries(1)), 2)
+            self.assertEqual(mock_request.call_count, 1)
+
+            frozen_time.tick(settings.ORIS_SINGLE_FLIGHT_TIMEOUT + 1)
+            ORISClient.get_event_entries(1)
+            self.assertEqual(mock_request.call_count, 2)
+
+    def test_concurrent_requests_are_coalesced(self):
+        started = threading.Event()
+
+        def make_request(*args, **kwargs):
+            started.wait(timeout=5)
+            return {'Entry_1': {'UserID': '1'}}
+
+        with mock.patch('orienteering_accounts.oris.client.ORISClient.make_request', side_effect=make_request) as mock_request:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(ORISClient.make_get_request, 'getEventEntries', {'eventid': 1}) for _ in range(4)]
+                time.sleep(0.1)
+                started.set()
+                results = [future.result() for future in futures]
+
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(results, [{'Entry_1': {'UserID': '1'}}] * 4)
+
+    def test_concurrent_invalidations_are_not_lost(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: ORISClient.invalidate_cache('getClubUserList'), range(20)))
+
+        self.assertEqual(cache.get(ORISClient._get_cache_generation_key('getClubUserList')), 20)
+
+    def test_cache_key_excludes_credentials(self):
+        cache_key = ORISClient.get_cache_key('getEventEntries', {'eventid': 1, 'username': 'user', 'password': 'secret'})
+        self.assertEqual(cache_key, ORISClient.get_cache_key('getEventEntries', {'eventid': 1, 'username': 'user', 'password': 'another'}))
+        self.assertNotIn('secret', cache_key)
+
+        # Authenticated responses are not shared with unauthenticated requests
+        self.assertNotEqual(cache_key, ORISClient.get_cache_key('getEventEntries', {'eventid': 1}))
+
+    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_request', return_value={"ClubMembers": {}})
+    def test_entry_rights_change_invalidates_club_roster(self, mock_request):
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 1})
+        ORISClient.set_club_entry_rights(1, club_key=1, can_entry_self=True)
+        ORISClient.make_get_request('getClubUserList', params={'clubkey': 1})
+
+        self.assertEqual([call.args[1] for call in mock_request.call_args_list], ['getClubUserList', 'setClubEntryRights', 'getClubUserList'])
+
+
+CLUB_USER_LIST_RESPONSE_DATA = {
+    'ClubMembers': {
+        f'Member_{i}': {
+            'ID': str(1000 + i), 'UserID': str(i), 'RegNum': f'TZL{i:04}', 'AllowEntrySelf': '1', 'AllowEntryOther': '0',
+            'MemberFrom': '2020-01-01', 'MemberTo': '2099-12-31', 'Valid': '1', 'Username': f'user{i}',
+            'FirstName': 'Chuck', 'LastName': 'Norris', 'Email': f'user{i}@example.com', 'AddressGPSLat': '0',
+            'AddressGPSLon': '0', 'Street': '', 'City': '', 'Zip': '', 'Country': 'CZ', 'Birthday': '1970-03-10',
+            'Phone': '', 'Gender': 'M', 'PersNum': '', 'Nationality': 'CZ', 'SI': '', 'SISport': '0', 'SIType': '0',
+            'SI2': '', 'SISport2': '0', 'SIType2': '0', 'SI3': '', 'SISport3': '0', 'SIType3': '0', 'IOFID': '0',
+            'ShowFullCalendar': '0', 'MyRegionsInCalendar': '', 'DoNotReceiveEmailsFromORIS': '0',
+            'NotifyAboutFeedbackByEmail': '0'
+        }
+        for i in range(1, 4)
+    }
+}
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ORISClientClubRosterTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ORISClient._club_rosters.clear()
+        ORISClient._club_rosters_refetched.clear()
+
+    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_request', return_value=CLUB_USER_LIST_RESPONSE_DATA)
+    def test_club_roster_is_fetched_once(self, mock_request):
+        for user_id in range(1, 4):
+            self.assertEqual(ORISClient.get_club_member(user_id).registration_number, f'TZL{user_id:04}')
+
+        club_roster = ORISClient.get_club_roster()
+        self.assertEqual(len(club_roster), 3)
+        self.assertEqual(club_roster.get_member_by_registration_number('TZL0002').user_id, 2)
+        self.assertEqual(mock_request.call_count, 1)
+
+    @mock.patch('orienteering_accounts.oris.client.ORISClient.make_request', return_value=CLUB_USER_LIST_RESPONSE_DATA)
+    def test_missing_club_member_refreshes_roster(self, mock_request):
+        self.assertIsNone(ORISClient.get_club_member(999))
+        self.assertEqual(mock_request.call_count, 2)
+
+        # Other non-members do not refetch the roster again
+        self.assertIsNone(ORISClient.get_club_member(998))
+        self.assertIsNone(ORISClient.get_club_member(997))
+        self.assertEqual(mock_request.call_count, 2)
+
+        with mock.patch('orienteering_accounts.oris.client.time.monotonic',
+                        return_value=time.monotonic() + settings.ORIS_CLUB_ROSTER_MAX_AGE):
+            self.assertIsNone(ORISClient.get_club_member(996))
+        self.assertEqual(mock_request.call_count, 3)
+
+
+class ORISClientStreamingTestCase(TestCase):
+
+    def test_registered_users_are_filtered_while_parsing(self):
+        response_data = dict(ORIS_REGISTER_USERS_RESPONSE_DATA)
+        response_data['Reg_174934'] = dict(response_data['Reg_174933'], RegNo='ABC1234', ClubID='other')
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.raw = io.BytesIO(json.dumps({'Method': 'getRegistration', 'Data': response_data}).encode())
+
+        with mock.patch.object(ORISClient.get_session(), 'get', return_value=response):
+            registered_users = ORISClient.iter_registered_users(year=2021)
+            self.assertIsInstance(registered_users, types.GeneratorType)
+            self.assertEqual([user.registration_number for user in registered_users], ['TZL6666', 'TZL9999'])
+
+
+class ORISServerHandler(BaseHTTPRequestHandler):
+    """ Responds with statuses of the server in order, 'close' drops the connection without response """
+
+    def handle_request(self):
+        self.server.requests.append(self.command)
+        action = self.server.actions.pop(0)
+
+        if action == 'close':
+            self.close_connection = True
+            return
+
+        body = b'{"Data": {}}'
+        self.send_response(action)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    ORIS_API_RATE_LIMITS={
+        'default': {'rate': 1000, 'burst': 1000, 'max_in_flight': 4},
+        'getEventEntries': {'rate': 1000, 'burst': 1000, 'max_in_flight': 4},
+    }
+)
+class ORISClientRetryTestCase(TestCase):
+
+    def setUp(self):
+        reset_throttles()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ORISServerHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        reset_throttles()
+
+    def make_request(self, method: str, actions: list, url: str = None):
+        self.server.actions = actions
+        url = url or f'http://127.0.0.1:{self.server.server_port}/API/'
+
+        with override_settings(ORIS_API_URL=url), \
+                mock.patch.object(ORISClient, '_session', ORISClient.create_session()), \
+                mock.patch('orienteering_accounts.oris.client.random.uniform', return_value=0.25), \
+                mock.patch('urllib3.util.retry.time.sleep') as mock_sleep:
+            try:
+                return ORISClient.make_request(method, 'getEventEntries', params={'eventid': 1})
+            finally:
+                self.sleeps = [call.args[0] for call in mock_sleep.call_args_list]
+
+    def test_server_errors_are_retried_with_jittered_backoff(self):
+        self.assertEqual(self.make_request('GET', [503, 'close', 200]), {})
+
+        self.assertEqual(self.server.requests, ['GET'] * 3)
+        # No backoff for the first retry, then exponential backoff, jitter is added to every retry
+        self.assertEqual(self.sleeps, [0.25, 2 * settings.ORIS_API_RETRY_BACKOFF_FACTOR + 0.25])
+        # Retries are counted against the rate limit of the method
+        self.assertEqual(ORISClient.get_throttle_stats()['getEventEntries']['requests'], 3)
+
+    def test_connection_errors_are_retried(self):
+        with socket.socket() as unused_socket:
+            unused_socket.bind(('127.0.0.1', 0))
+            unused_port = unused_socket.getsockname()[1]
+
+        with self.assertRaises(requests.ConnectionError):
+            self.make_request('GET', [], url=f'http://127.0.0.1:{unused_port}/API/')
+
+        self.assertEqual(len(self.sleeps), settings.ORIS_API_MAX_RETRIES)
+        self.assertEqual(ORISClient.get_throttle_stats()['getEventEntries']['requests'], settings.ORIS_API_MAX_RETRIES + 1)
+
+    def test_non_idempotent_requests_are_not_retried(self):
+        with self.assertRaises(requests.HTTPError):
+            self.make_request('POST', [503, 200])
+        with self.assertRaises(requests.ConnectionError):
+            self.make_request('POST', ['close', 200])
+
+        self.assertEqual(self.server.requests, ['POST'] * 2)
+
+    def test_pool_size(self):
+        with override_settings(ORIS_API_POOL_SIZE=3):
+            session = ORISClient.create_session()
+
+        adapter = session.get_adapter('https://oris.orientacnisporty.cz/API/')
+        self.assertEqual(adapter.poolmanager.connection_pool_kw['maxsize'], 3)
+        self.assertTrue(adapter.poolmanager.connection_pool_kw['block'])
+        self.assertEqual(adapter.max_retries.total, settings.ORIS_API_MAX_RETRIES)
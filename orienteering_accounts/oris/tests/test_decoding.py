@@ -0,0 +1,66 @@
+import timeit
+
+from django.test import SimpleTestCase
+from pydantic import BaseModel, ValidationError, validator
+
+from orienteering_accounts.event.tests import fixtures
+from orienteering_accounts.oris.decoding import decode
+from orienteering_accounts.oris.models import Event, Entry, ClubMember
+from orienteering_accounts.oris.tests.test_client import CLUB_USER_LIST_RESPONSE_DATA
+
+
+PAYLOADS = [
+    (Event, fixtures.ORIS_EVENTS_RESPONSE_DATA['Event_5712']),
+    (Event, fixtures.ORIS_EVENT_RESPONSE_DATA),
+    *[(Entry, entry_dict) for entry_dict in fixtures.ORIS_EVENT_ENTRIES_RESPONSE_DATA.values()],
+    (ClubMember, CLUB_USER_LIST_RESPONSE_DATA['ClubMembers']['Member_1']),
+]
+
+
+class DecodingTestCase(SimpleTestCase):
+
+    def test_trusted_decoding_equals_validation(self):
+        for model_class, data in PAYLOADS:
+            validated = model_class(**data)
+            decoded = decode(model_class, data, trusted=True)
+            self.assertEqual(decoded, validated)
+            self.assertEqual(decoded.__fields_set__, validated.__fields_set__)
+
+    def test_invalid_payload_falls_back_to_validation(self):
+        with self.assertRaises(ValidationError):
+            decode(Entry, dict(fixtures.ORIS_EVENT_ENTRIES_RESPONSE_DATA['Entry_1830201'], Fee='free'), trusted=True)
+
+    def test_non_string_value_of_string_field_falls_back_to_validation(self):
+        entry_dict = fixtures.ORIS_EVENT_ENTRIES_RESPONSE_DATA['Entry_1830201']
+
+        for category_name in ({'Name': 'H21'}, ['H21']):
+            with self.assertRaises(ValidationError):
+                decode(Entry, dict(entry_dict, ClassDesc=category_name), trusted=True)
+
+        self.assertEqual(decode(Entry, dict(entry_dict, ClassDesc=21), trusted=True).category_name, '21')
+
+    def test_validator_error_raises_validation_error(self):
+        class Model(BaseModel):
+            name: str
+
+            @validator('name')
+            def not_empty(cls, v: str) -> str:
+                if not v:
+                    raise ValueError('Name is empty')
+                return v
+
+        with self.assertRaises(ValidationError):
+            decode(Model, {'name': ''}, trusted=True)
+
+    def test_trusted_decoding_benchmark(self):
+        """ Only reports timings, which depend on the machine running tests """
+        number = 500
+
+        validation_time = sum(
+            timeit.timeit(lambda: model_class(**data), number=number) for model_class, data in PAYLOADS
+        )
+        decoding_time = sum(
+            timeit.timeit(lambda: decode(model_class, data, trusted=True), number=number) for model_class, data in PAYLOADS
+        )
+
+        print(f'\nDecoding ORIS payloads {number} times: validation {validation_time:.3f} s, trusted decoding {decoding_time:.3f} s')
@@ -0,0 +1,78 @@
+import asyncio
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from orienteering_accounts.oris.client import ORISClient
+from orienteering_accounts.oris.throttling import TokenBucket, reset_throttles, get_throttle
+
+
+def make_response(status_code: int, headers: dict = None, content: bytes = b'{"Data": {}}') -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = content
+    return response
+
+
+@override_settings(
+    ORIS_API_URL='https://oris.orientacnisporty.cz/API/',
+    ORIS_API_RATE_LIMITS={
+        'default': {'rate': 1000, 'burst': 1000, 'max_in_flight': 4},
+        'getEventEntries': {'rate': 1000, 'burst': 1000, 'max_in_flight': 2},
+    }
+)
+class ThrottlingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        reset_throttles()
+
+    def tearDown(self):
+        reset_throttles()
+
+    @mock.patch('orienteering_accounts.oris.throttling.time.monotonic', return_value=100.0)
+    def test_token_bucket(self, mock_monotonic):
+        bucket = TokenBucket(rate=2, capacity=2)
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0, 0, 0.5, 1])
+
+        mock_monotonic.return_value = 102.0
+        self.assertEqual(bucket.reserve(), 0)
+
+        bucket.pause(10)
+        self.assertEqual(bucket.reserve(), 10)
+
+    @mock.patch('orienteering_accounts.oris.throttling.time.sleep')
+    def test_rate_limited_request_is_retried(self, mock_sleep):
+        responses = [make_response(429, {'Retry-After': '3'}), make_response(200)]
+
+        with mock.patch.object(ORISClient.get_session(), 'request', side_effect=responses) as mock_request:
+            self.assertEqual(ORISClient.make_request('GET', 'getEventEntries', params={'eventid': 1}), {})
+
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 3, places=1)
+
+        stats = ORISClient.get_throttle_stats()['getEventEntries']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['rate_limited'], 1)
+        self.assertNotIn('default', ORISClient.get_throttle_stats())
+
+    def test_async_requests_in_flight_are_limited(self):
+        throttle = get_throttle('getEventEntries')
+        in_flight = []
+
+        async def request():
+            async with throttle.acquire_async():
+                in_flight.append(1)
+                max_in_flight = len(in_flight)
+                await asyncio.sleep(0.01)
+                in_flight.pop()
+                return max_in_flight
+
+        async def run():
+            return await asyncio.gather(*[request() for _ in range(6)])
+
+        self.assertEqual(max(asyncio.run(run())), 2)
+        # Semaphore of another event loop
+        self.assertEqual(max(asyncio.run(run())), 2)
+        self.assertEqual(throttle.get_stats()['requests'], 12)
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+import typing
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+
+from django.conf import settings
+
+
+class TokenBucket:
+    """ Allows rate requests per second on average with bursts of up to capacity requests """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """ Takes one token and returns seconds to wait before it may be used """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float):
+        """ Lets no request through for given seconds, e.g. after ORIS responded with 429 """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0)
+
+
+class Throttle:
+    """ Rate limit and maximum of concurrent requests of one ORIS method """
+
+    def __init__(self, rate: float, burst: int, max_in_flight: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.semaphore = threading.BoundedSemaphore(max_in_flight)
+        self.async_semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.throttled_time = 0.0
+
+    @contextmanager
+    def acquire(self) -> typing.Iterator[None]:
+        with self.semaphore:
+            self.wait()
+            yield
+
+    def wait(self):
+        """ Waits for rate limit of one request, which is already counted as in flight, e.g. retry of a request """
+        started = time.monotonic()
+        wait = self.bucket.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+        self._record_request(started)
+
+    @asynccontextmanager
+    async def acquire_async(self) -> typing.AsyncIterator[None]:
+        """ Same as acquire() for asynchronous requests, concurrency is limited per event loop """
+        started = time.monotonic()
+        async with self._get_async_semaphore():
+            wait = self.bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            self._record_request(started)
+            yield
+
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives are bound to the event loop they are used in
+        loop = asyncio.get_running_loop()
+        with self.stats_lock:
+            semaphore = self.async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self.async_semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return semaphore
+
+    def _record_request(self, started: float):
+        with self.stats_lock:
+            self.requests += 1
+            self.throttled_time += time.monotonic() - started
+
+    def pause(self, seconds: float):
+        with self.stats_lock:
+            self.rate_limited += 1
+        self.bucket.pause(seconds)
+
+    def get_stats(self) -> dict:
+        with self.stats_lock:
+            return {
+                'requests': self.requests,
+                'rate_limited': self.rate_limited,
+                'throttled_time': self.throttled_time,
+            }
+
+
+_throttles: typing.Dict[str, Throttle] = {}
+_throttles_lock = threading.Lock()
+
+
+def get_throttle(endpoint: str) -> Throttle:
+    """
+    Returns throttle shared by all threads of the process for given ORIS method.
+    Limits are taken from ORIS_API_RATE_LIMITS, methods not listed there share the default throttle.
+    """
+    key = endpoint if endpoint in settings.ORIS_API_RATE_LIMITS else 'default'
+
+    throttle = _throttles.get(key)
+    if throttle is None:
+        with _throttles_lock:
+            throttle = _throttles.get(key)
+            if throttle is None:
+                throttle = _throttles[key] = Throttle(**settings.ORIS_API_RATE_LIMITS[key])
+    return throttle
+
+
+def get_throttle_stats() -> typing.Dict[str, dict]:
+    return {key: throttle.get_stats() for key, throttle in _throttles.items()}
+
+
+def reset_throttles():
+    with _throttles_lock:
+        _throttles.clear()
@@ -1,7 +1,9 @@
+import threading
 import typing
 from datetime import datetime
 
-import requests_pkcs12
+import requests
+from requests_pkcs12 import Pkcs12Adapter
 
 from uuid import uuid4
 from django.conf import settings
@@ -11,6 +13,27 @@ from orienteering_accounts.rb.models import Transaction
 
 class RBBankAPIClient:
 
+    _session: typing.Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+
+    @classmethod
+    def create_session(cls) -> requests.Session:
+        session = requests.Session()
+        session.mount(settings.RB_API_URL, Pkcs12Adapter(
+            pkcs12_filename=settings.RB_API_P12_CERT_PATH,
+            pkcs12_password=settings.RB_API_P12_CERT_PASSWORD
+        ))
+        return session
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """ Shared session, so the client certificate is loaded and TLS connection established only once """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    cls._session = cls.create_session()
+        return cls._session
+
     @classmethod
     def make_request(cls, method: str, endpoint: str, params: dict = None, data: dict = None, **kwargs):
         headers= {
@@ -21,15 +44,12 @@ class RBBankAPIClient:
 
         url = f'{settings.RB_API_URL}/{endpoint}'
 
-        request_func = getattr(requests_pkcs12, method.lower())
-
-        response = request_func(
+        response = cls.get_session().request(
+            method.upper(),
             url,
             params=params,
             headers=headers,
             json=data,
-            pkcs12_filename=settings.RB_API_P12_CERT_PATH,
-            pkcs12_password=settings.RB_API_P12_CERT_PASSWORD,
             **kwargs
         )
         response.raise_for_status()
@@ -54,29 +74,34 @@ class RBBankAPIClient:
                          to_date: datetime,
                          bank_account_number: str = settings.CLUB_BANK_ACCOUNT_NUMBER,
                          currency: str = 'CZK',
-                         page: int = 1,
                          ) -> typing.List[Transaction]:
-        params = {
-            'from': from_date.isoformat(),
-            'to': to_date.isoformat(),
-            'page': page
-        }
-        endpoint = f'accounts/{bank_account_number}/{currency}/transactions'
-        response: dict = cls.make_get_request(endpoint, params=params)
+        return [
+            transaction
+            for transactions in cls.iter_transaction_pages(from_date, to_date, bank_account_number, currency)
+            for transaction in transactions
+        ]
 
-        transactions = []
+    @classmethod
+    def iter_transaction_pages(cls,
+                               from_date: datetime,
+                               to_date: datetime,
+                               bank_account_number: str = settings.CLUB_BANK_ACCOUNT_NUMBER,
+                               currency: str = 'CZK',
+                               ) -> typing.Iterator[typing.List[Transaction]]:
+        """ Yields transactions page by page, next page is requested only when the current one is consumed """
+        endpoint = f'accounts/{bank_account_number}/{currency}/transactions'
+        page = 1
 
-        for transaction_data in response['transactions']:
-            transaction = Transaction(**transaction_data)
-            transactions.append(transaction)
+        while True:
+            params = {
+                'from': from_date.isoformat(),
+                'to': to_date.isoformat(),
+                'page': page
+            }
+            response: dict = cls.make_get_request(endpoint, params=params)
 
-        if not response['lastPage']:
-            transactions += cls.get_transactions(
-                from_date=from_date,
-                to_date=to_date,
-                bank_account_number=bank_account_number,
-                currency=currency,
-                page=page + 1
-            )
+            yield [Transaction(**transaction_data) for transaction_data in response['transactions']]
 
-        return transactions
+            if response['lastPage']:
+                break
+            page += 1
@@ -0,0 +1,41 @@
+import types
+from datetime import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from orienteering_accounts.rb.client import RBBankAPIClient
+
+
+def make_transaction_data(entry_reference: str) -> dict:
+    return {
+        'entryReference': entry_reference,
+        'amount': {'value': 100, 'currency': 'CZK'},
+        'creditDebitIndication': 'CRDT',
+        'bookingDate': '2024-03-01T00:00:00.000+01:00',
+        'valueDate': '2024-03-01T00:00:00.000+01:00',
+        'bankTransactionCode': {'code': '10000405000'},
+        'entryDetails': {'transactionDetails': {'references': {}, 'relatedParties': {}}},
+    }
+
+
+class RBBankAPIClientTestCase(SimpleTestCase):
+
+    def test_transactions_are_read_page_by_page(self):
+        responses = {
+            1: {'transactions': [make_transaction_data('1'), make_transaction_data('2')], 'lastPage': False},
+            2: {'transactions': [make_transaction_data('3')], 'lastPage': False},
+            3: {'transactions': [], 'lastPage': True},
+        }
+
+        def make_get_request(endpoint, params):
+            return responses[params['page']]
+
+        with mock.patch.object(RBBankAPIClient, 'make_get_request', side_effect=make_get_request) as mock_request:
+            pages = RBBankAPIClient.iter_transaction_pages(datetime(2024, 3, 1), datetime(2024, 3, 2))
+            self.assertIsInstance(pages, types.GeneratorType)
+            self.assertEqual([[transaction.entryReference for transaction in page] for page in pages], [['1', '2'], ['3'], []])
+            self.assertEqual(mock_request.call_count, 3)
+
+            transactions = RBBankAPIClient.get_transactions(datetime(2024, 3, 1), datetime(2024, 3, 2))
+            self.assertEqual([transaction.entryReference for transaction in transactions], ['1', '2', '3'])
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.18 on 2026-10-18 09:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('event', '0012_event_handled_disabled'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Result',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registration_number', models.CharField(max_length=255)),
+                ('class_name', models.CharField(blank=True, default='', max_length=255)),
+                ('time', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_results', to='event.event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='result',
+            constraint=models.UniqueConstraint(fields=('event', 'registration_number'), name='result_unique_event_registration_number'),
+        ),
+    ]
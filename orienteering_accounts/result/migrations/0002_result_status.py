@@ -0,0 +1,34 @@
+# Generated by Django 3.2.18 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+ORIS_TIME_STATUSES = {
+    'DNS': 'DNS',
+    'DNF': 'DNF',
+    'MP': 'MP',
+    'DISK': 'DSQ',
+    'DSQ': 'DSQ',
+}
+
+
+def set_statuses(apps, schema_editor):
+    Result = apps.get_model('result', 'Result')
+
+    for time, status in ORIS_TIME_STATUSES.items():
+        Result.objects.filter(time__iexact=time).update(status=status)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('result', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='status',
+            field=models.CharField(choices=[('OK', 'Klasifikován'), ('DNS', 'Nestartoval'), ('DNF', 'Nedokončil'), ('MP', 'Chybná ražení'), ('DSQ', 'Diskvalifikován')], default='OK', max_length=3),
+        ),
+        migrations.RunPython(set_statuses, migrations.RunPython.noop),
+    ]
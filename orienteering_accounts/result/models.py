@@ -0,0 +1,60 @@
+import typing
+
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from orienteering_accounts.core.utils.db import bulk_upsert
+from orienteering_accounts.oris.models import Result as OrisResult
+
+
+class Result(models.Model):
+    """ Result of club member in event, stored so event bills do not request ORIS """
+
+    class Status(models.TextChoices):
+        OK = 'OK', _('Klasifikován')
+        DID_NOT_START = 'DNS', _('Nestartoval')
+        DID_NOT_FINISH = 'DNF', _('Nedokončil')
+        MISSING_PUNCH = 'MP', _('Chybná ražení')
+        DISQUALIFIED = 'DSQ', _('Diskvalifikován')
+
+    # Times of ORIS results, which are not times but statuses
+    ORIS_TIME_STATUSES = {
+        'DNS': Status.DID_NOT_START,
+        'DNF': Status.DID_NOT_FINISH,
+        'MP': Status.MISSING_PUNCH,
+        'DISK': Status.DISQUALIFIED,
+        'DSQ': Status.DISQUALIFIED,
+    }
+
+    event = models.ForeignKey('event.Event', related_name='event_results', on_delete=models.CASCADE)
+    registration_number = models.CharField(max_length=255)
+    class_name = models.CharField(max_length=255, blank=True, default='')
+    time = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=3, choices=Status.choices, default=Status.OK)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'registration_number'], name='result_unique_event_registration_number')
+        ]
+
+    def __str__(self):
+        return f'{self.event} result {self.registration_number}'
+
+    @classmethod
+    def get_status(cls, time: typing.Optional[str]) -> str:
+        return cls.ORIS_TIME_STATUSES.get((time or '').strip().upper(), cls.Status.OK)
+
+    @classmethod
+    def from_oris(cls, result: OrisResult, event: 'Event') -> 'Result':
+        return cls(event=event, status=cls.get_status(result.time), **result.dict())
+
+    @classmethod
+    def bulk_upsert_from_oris(cls, results: typing.Iterable[OrisResult], event: 'Event') -> typing.List['Result']:
+        instances = [cls.from_oris(result, event) for result in results]
+        bulk_upsert(cls, instances, unique_fields=['event', 'registration_number'], update_fields=['class_name', 'time', 'status'])
+        return instances
+
+    @property
+    def did_not_start(self) -> bool:
+        return self.status == self.Status.DID_NOT_START
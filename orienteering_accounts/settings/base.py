@@ -59,6 +59,7 @@ INSTALLED_APPS = [
     'orienteering_accounts.account',
     'orienteering_accounts.event',
     'orienteering_accounts.entry',
+    'orienteering_accounts.result',
     'anymail',
     "crispy_forms",
     "crispy_bootstrap5"
@@ -291,8 +292,49 @@ ORIS_SOURCE_TYPE_BULLETIN_ID = '1'
 ORIS_API_URL = config('PROJECT_ORIS_API_URL', '')
 ORIS_API_USERNAME = config('PROJECT_ORIS_API_USERNAME', '')
 ORIS_API_PASSWORD = config('PROJECT_ORIS_API_PASSWORD', '')
+ORIS_API_POOL_SIZE = config('PROJECT_ORIS_API_POOL_SIZE', default=10, cast=int)
+ORIS_API_CONNECT_TIMEOUT = config('PROJECT_ORIS_API_CONNECT_TIMEOUT', default=5, cast=float)
+ORIS_API_READ_TIMEOUT = config('PROJECT_ORIS_API_READ_TIMEOUT', default=30, cast=float)
+ORIS_API_MAX_RETRIES = config('PROJECT_ORIS_API_MAX_RETRIES', default=3, cast=int)
+ORIS_API_RETRY_BACKOFF_FACTOR = 0.5
+ORIS_API_RETRY_BACKOFF_JITTER = 0.5
+ORIS_API_RETRY_STATUSES = (500, 502, 503, 504)
+ORIS_API_RETRY_AFTER_MAX = 2 * 60
+# Requests per second, burst size and maximum of concurrent requests per ORIS method, others share the default limits
+ORIS_API_RATE_LIMITS = {
+    'default': {'rate': 5, 'burst': 10, 'max_in_flight': 4},
+    'getEventEntries': {'rate': 4, 'burst': 8, 'max_in_flight': 4},
+    'getEventResults': {'rate': 4, 'burst': 8, 'max_in_flight': 4},
+    'setClubEntryRights': {'rate': 2, 'burst': 4, 'max_in_flight': 2},
+}
+ORIS_IMPORT_CONCURRENCY = config('PROJECT_ORIS_IMPORT_CONCURRENCY', default=4, cast=int)
+ORIS_IMPORT_BATCH_SIZE = 500
+# Seconds for which GET responses of ORIS methods are cached
+ORIS_API_CACHE_TIMEOUTS = {
+    'getClubUserList': 60 * 60,
+    'getEventList': 10 * 60,
+    'getEventBalance': 10 * 60,
+    'getEventResults': 10 * 60,
+}
+ORIS_API_NEGATIVE_CACHE_TIMEOUT = 5 * 60
+ORIS_API_CACHE_EXCLUDED_PARAMS = ('username', 'password')
+ORIS_CLUB_ROSTER_MAX_AGE = 10 * 60
+# Seconds for which responses of read-only ORIS_SINGLE_FLIGHT_METHODS are shared by identical requests,
+# methods listed neither here nor in ORIS_API_CACHE_TIMEOUTS are never cached
+ORIS_SINGLE_FLIGHT_TIMEOUT = 30
+ORIS_SINGLE_FLIGHT_LOCK_TIMEOUT = 60
+ORIS_SINGLE_FLIGHT_METHODS = ('getEvent', 'getEventEntries', 'getEventServiceEntries')
+# Cached responses of ORIS methods changed by the write method are invalidated after it
+ORIS_API_CACHE_INVALIDATED_BY = {
+    'setClubEntryRights': ('getClubUserList',),
+}
+# Decodes ORIS payloads without full pydantic validation, falls back to validation for unexpected data
+ORIS_TRUSTED_DECODING = config('PROJECT_ORIS_TRUSTED_DECODING', default=True, cast=bool)
 
 REFRESH_EVENTS_BEFORE_DAYS = 14
+# Results of finished events are polled until they do not change for ORIS_RESULTS_STABLE_AFTER_HOURS
+ORIS_RESULTS_REFRESH_INTERVAL_MINUTES = 60
+ORIS_RESULTS_STABLE_AFTER_HOURS = 24
 
 TEMPLATE_DATETIME_FORMAT = '%d.%m.%Y %H:%M'
 TEMPLATE_DATE_FORMAT = '%d.%m.%Y'